@@ -0,0 +1,63 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, CancelledError, wait
+from models import Car, engine, session_scope
+from reports import REPORTS, register_font, report_file_name, build_report
+
+# Инициализация процесса пула: свое подключение к базе и зарегистрированный шрифт
+def init_worker():
+    engine.dispose(close=False)
+    register_font()
+
+# Все отчеты по одному автомобилю; выполняется в процессе пула
+def render_car_reports(car_id, directory, kinds):
+    with session_scope() as scoped:
+        mark, model, number = scoped.query(Car.mark, Car.model, Car.number).filter_by(car_id=car_id).one()
+    paths = []
+    for kind in kinds:
+        paths.append(build_report(kind, car_id, os.path.join(directory, report_file_name(kind, mark, model, number))))
+    return paths
+
+# Пакетная генерация отчетов по автопарку. Задача - один автомобиль, поэтому
+# отмена останавливает все еще не начатые автомобили
+class BatchReports:
+    def __init__(self, car_ids, directory, kinds=tuple(REPORTS), workers=None):
+        # spawn: дочерние процессы не наследуют потоки Qt и соединения родителя
+        self.executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=init_worker)
+        self.futures = [self.executor.submit(render_car_reports, car_id, directory, tuple(kinds)) for car_id in car_ids]
+        self.cancelled = False
+
+    def progress(self):
+        return sum(future.done() for future in self.futures), len(self.futures)
+
+    def done(self):
+        return all(future.done() for future in self.futures)
+
+    def cancel(self):
+        self.cancelled = True
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def wait(self):
+        wait(self.futures)
+        self.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    # Созданные файлы и ошибки по автомобилям
+    def results(self):
+        paths, errors = [], []
+        for future in self.futures:
+            if not future.done():
+                continue
+            try:
+                paths += future.result()
+            except CancelledError:
+                pass
+            except Exception as e:
+                errors.append(str(e))
+        return paths, errors
\ No newline at end of file
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.orm import undefer, defaultload
+from models import Car, Driver, ServiceCar, ExpensesCar, engine, session
+
+# Пиковый RSS процесса в мегабайтах
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Замер загрузки главного окна: список машин и их водители, как в MainWindow и CarCard
+def bench_startup(eager_photos=False):
+    query = session.query(Car).filter_by(is_archived=False)
+    if eager_photos:
+        # Поведение до отложенной загрузки фото
+        query = query.options(undefer(Car.photo), defaultload(Car.driver).undefer(Driver.photo))
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    cars = query.all()
+    for car in cars:
+        car.driver
+    elapsed = time.perf_counter() - start
+    print(f"startup: {len(cars)} автомобилей, {elapsed * 1000:.1f} мс, RSS {rss_before:.1f} -> {rss_mb():.1f} МБ"
+          f" ({'фото сразу' if eager_photos else 'фото отложены'})")
+
+# Пакетные отчеты по первым cars автомобилям в пуле из workers процессов
+def bench_batch_reports(workers, cars):
+    from batch import BatchReports
+    car_ids = [car_id for car_id, in session.query(Car.car_id).filter_by(is_archived=False).order_by(Car.car_id).limit(cars)]
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        batch = BatchReports(car_ids, directory, workers=workers)
+        batch.wait()
+        elapsed = time.perf_counter() - start
+        paths, errors = batch.results()
+    print(f"reports: {len(car_ids)} автомобилей, {len(paths)} файлов, процессов {workers}, {elapsed:.2f} с"
+          f" ({len(paths) / elapsed:.1f} отчётов/с), ошибок {len(errors)}")
+
+# Время построения каждого отчета по одному автомобилю: первый вызов (разбор шрифта) и последующие
+def bench_report_latency(car_id, repeat):
+    from reports import REPORTS
+    car_id = car_id or session.query(Car.car_id).order_by(Car.car_id).limit(1).scalar()
+    with tempfile.TemporaryDirectory() as directory:
+        for kind, (build, _) in REPORTS.items():
+            timings = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                build(car_id, os.path.join(directory, f"{kind}_{i}.pdf"))
+                timings.append((time.perf_counter() - start) * 1000)
+            warm = sorted(timings[1:]) or timings
+            print(f"report {kind}: первый {timings[0]:.1f} мс, медиана {warm[len(warm) // 2]:.1f} мс, мин {warm[0]:.1f} мс")
+
+# Отчеты через кэш: первый проход строит файлы, второй берет их из кэша
+def bench_report_cache(car_id):
+    from reports import REPORTS, build_report
+    from report_cache import ReportCache
+    car_id = car_id or session.query(Car.car_id).order_by(Car.car_id).limit(1).scalar()
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ReportCache(os.path.join(directory, "cache"), 50 * 1024 * 1024)
+        for kind in REPORTS:
+            timings = []
+            for attempt in ("промах", "попадание"):
+                start = time.perf_counter()
+                build_report(kind, car_id, os.path.join(directory, f"{kind}.pdf"), cache=cache)
+                timings.append(f"{attempt} {(time.perf_counter() - start) * 1000:.1f} мс")
+            print(f"report {kind}: " + ", ".join(timings))
+        print("cache:", cache.stats())
+
+# Задержка подключения: новое соединение (с прагмами для SQLite) и выдача готового из пула
+def bench_connect(repeat):
+    def query():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1")).scalar()
+    def cold():
+        engine.dispose()
+        query()
+    print(f"connect: {engine.dialect.name}, новое соединение {best_ms(cold, repeat):.2f} мс, "
+          f"из пула {best_ms(query, repeat):.2f} мс")
+
+# Модули, которые не должны загружаться при запуске приложения
+LAUNCH_HEAVY_MODULES = ["reportlab", "openpyxl", "reports", "batch", "export", "multiprocessing"]
+
+# Замер запуска в отдельном процессе с холодными импортами: импорт main, первая отрисовка окна
+# и появление первой карточки; время от старта процесса в миллисекундах. Окно создается
+# zapusk.start, как при обычном запуске, вместе с проверкой версии схемы
+LAUNCH_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from PySide6.QtWidgets import QApplication
+app = QApplication(sys.argv[:1])
+import main
+import workers
+import zapusk
+imported = time.perf_counter()
+# Ошибка загрузки не должна останавливать замер модальным окном
+errors = []
+workers.show_message = lambda title, text, *args: errors.append(text)
+window = zapusk.start(app)
+app.processEvents()
+painted = time.perf_counter()
+while window.cursor.current() is None and window.empty_label.text() == "Загрузка..." and not errors and time.perf_counter() - painted < 30:
+    app.processEvents()
+    time.sleep(0.002)
+loaded = time.perf_counter()
+heavy = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+print(json.dumps({"import": (imported - start) * 1000, "paint": (painted - start) * 1000,
+                  "data": (loaded - start) * 1000, "heavy": heavy, "errors": errors}))
+"""
+
+# Запуск приложения с порогами: код возврата 1, если медиана превысила порог
+# или при старте загрузились модули отчетов
+def bench_launch(repeat, max_import_ms, max_paint_ms):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", LAUNCH_PROBE, json.dumps(LAUNCH_HEAVY_MODULES)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        if run["errors"]:
+            raise SystemExit(f"Ошибка при запуске: {run['errors'][0]}")
+        runs.append(run)
+    median = {key: sorted(run[key] for run in runs)[len(runs) // 2] for key in ("import", "paint", "data")}
+    heavy = sorted(set().union(*(run["heavy"] for run in runs)))
+    print(f"launch: импорт {median['import']:.0f} мс, окно {median['paint']:.0f} мс, первая карточка {median['data']:.0f} мс"
+          f" (медиана из {repeat})")
+    failures = []
+    if heavy:
+        failures.append(f"при запуске загружены {', '.join(heavy)}")
+    if median["import"] > max_import_ms:
+        failures.append(f"импорт {median['import']:.0f} мс > {max_import_ms} мс")
+    if median["paint"] > max_paint_ms:
+        failures.append(f"окно {median['paint']:.0f} мс > {max_paint_ms} мс")
+    for failure in failures:
+        print(f"Регрессия: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+# Лучшее время вызова fn из repeat в миллисекундах: минимум меньше медианы зависит
+# от посторонней нагрузки на машине
+def best_ms(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def navigate(steps):
+    from navigation import CarCursor
+    cursor = CarCursor(session)
+    cursor.first()
+    for _ in range(steps):
+        cursor.next()
+    session.expunge_all()
+
+def search_cold(terms):
+    from search import CarSearch
+    search = CarSearch(session)
+    for term in terms:
+        search.search(term)
+
+# Набор замеров слоя данных: запросы главного окна, навигации, поиска, открытия диалога ТО
+# и каждого отчета на автомобиле с наибольшим числом расходов
+def suite_benchmarks(repeat):
+    from queries import fetch_first_cars, fetch_services, fetch_expenses, fetch_due_services
+    from search import CarSearch
+    from lookups import LOOKUPS, lookup_cache
+    from reports import REPORTS
+    car_id = session.query(ExpensesCar.car_id).group_by(ExpensesCar.car_id)\
+        .order_by(func.count(ExpensesCar.expenses_car_id).desc()).limit(1).scalar()
+    car_id = car_id or session.query(Car.car_id).order_by(Car.car_id).limit(1).scalar()
+    mark, number = session.query(Car.mark, Car.number).filter_by(car_id=car_id).one()
+    terms = [number[:4].lower(), mark[:3].lower(), number[-5:].lower()]
+    warm_search = CarSearch(session)
+    results = {
+        "main_window": best_ms(lambda: fetch_first_cars(10), repeat),
+        "navigate_50": best_ms(lambda: navigate(50), repeat),
+        "search_cold": best_ms(lambda: search_cold(terms), max(repeat // 3, 1)),
+        "search": best_ms(lambda: [warm_search.search(term) for term in terms], repeat),
+        "open_service_dialog": best_ms(lambda: (fetch_services(car_id, limit=200), fetch_expenses(car_id, limit=200)), repeat),
+        "due_services": best_ms(lambda: fetch_due_services(date.today() + timedelta(days=30)), repeat),
+        "lookups": best_ms(lambda: [lookup_cache.invalidate() or lookup_cache.get(name) for name in LOOKUPS], repeat),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for kind, (build, _) in REPORTS.items():
+            results[f"report_{kind}"] = best_ms(lambda: build(car_id, os.path.join(directory, f"{kind}.pdf")),
+                                                  max(repeat // 3, 1))
+    return results
+
+def dataset_stamp():
+    return {
+        "dialect": engine.dialect.name,
+        "cars": session.query(func.count(Car.car_id)).scalar(),
+        "services": session.query(func.count(ServiceCar.service_car_id)).scalar(),
+        "expenses": session.query(func.count(ExpensesCar.expenses_car_id)).scalar(),
+    }
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty else "")
+
+# Замеры сохраняются строкой JSON в файл истории вместе с коммитом; сравнение идет
+# с последней записью на том же наборе данных. Код возврата 1, если max_regression задан
+# и какой-то замер стал медленнее больше чем на столько процентов (и больше чем на 1 мс)
+def bench_suite(repeat, history, max_regression=None):
+    stamp = dataset_stamp()
+    results = suite_benchmarks(repeat)
+    previous = None
+    if os.path.exists(history):
+        with open(history, encoding="utf-8") as file:
+            for line in file:
+                record = json.loads(line)
+                if record["dataset"] == stamp:
+                    previous = record
+    record = {"commit": git_commit(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "dataset": stamp, "results": results}
+    with open(history, "a", encoding="utf-8") as file:
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"suite: {stamp['dialect']}, автомобилей {stamp['cars']}, ТО {stamp['services']}, "
+          f"расходов {stamp['expenses']}; коммит {record['commit']}"
+          + (f", сравнение с {previous['commit']} от {previous['time']}" if previous else ""))
+    regressions = []
+    for name, value in results.items():
+        line = f"  {name}: {value:.1f} мс"
+        before = previous["results"].get(name) if previous else None
+        if before:
+            change = (value - before) / before * 100
+            line += f" ({change:+.0f}% к {before:.1f} мс)"
+            if max_regression is not None and change > max_regression and value - before > 1:
+                regressions.append(name)
+        print(line)
+    for name in regressions:
+        print(f"Регрессия: {name} медленнее более чем на {max_regression}%", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры производительности учета автопарка")
+    parser.add_argument("benchmark", choices=["startup", "launch", "connect", "suite", "reports", "report-latency", "report-cache"])
+    parser.add_argument("--eager-photos", action="store_true", help="загружать фото вместе со строками (старое поведение)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="число процессов для пакетных отчетов")
+    parser.add_argument("--cars", type=int, default=100, help="число автомобилей для пакетных отчетов")
+    parser.add_argument("--car-id", type=int, help="автомобиль для замера отчетов, по умолчанию первый")
+    parser.add_argument("--repeat", type=int, default=10, help="повторов каждого отчета или запуска")
+    parser.add_argument("--max-import-ms", type=int, default=1500, help="порог времени импорта для launch")
+    parser.add_argument("--max-paint-ms", type=int, default=2500, help="порог времени до показа окна для launch")
+    parser.add_argument("--history", default="bench_history.jsonl", help="файл истории замеров suite")
+    parser.add_argument("--max-regression", type=float, help="допустимое замедление suite в процентах к прошлому замеру")
+    args = parser.parse_args()
+    if args.benchmark == "startup":
+        bench_startup(args.eager_photos)
+    elif args.benchmark == "connect":
+        bench_connect(args.repeat)
+    elif args.benchmark == "suite":
+        sys.exit(bench_suite(args.repeat, args.history, args.max_regression))
+    elif args.benchmark == "launch":
+        sys.exit(bench_launch(args.repeat, args.max_import_ms, args.max_paint_ms))
+    elif args.benchmark == "reports":
+        bench_batch_reports(args.workers, args.cars)
+    elif args.benchmark == "report-latency":
+        bench_report_latency(args.car_id, args.repeat)
+    elif args.benchmark == "report-cache":
+        bench_report_cache(args.car_id)
\ No newline at end of file
@@ -0,0 +1,142 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+# Консольный запуск без Qt для ночных заданий:
+#   python cli.py report --out reports/ [--kind car --kind expenses] [--car 12 --car А123ВС77] [--workers 4]
+#   python cli.py export expenses --out expenses.csv [--car 12]
+#   python cli.py due [--days 30] [--csv]
+#   python cli.py import services services.csv [--skip-invalid] [--create-lookups]
+# Тяжелые модули (ReportLab, openpyxl) импортируются только в той команде, которой они нужны
+
+# Автомобили по id или госномеру; без --car - весь действующий автопарк
+def resolve_cars(values):
+    from models import Car, session_scope
+    with session_scope() as scoped:
+        if not values:
+            return [car_id for car_id, in scoped.query(Car.car_id).filter(Car.is_archived == False).order_by(Car.car_id)]
+        car_ids = []
+        for value in values:
+            column = Car.car_id if value.isdigit() else Car.number
+            car_id = scoped.query(Car.car_id).filter(column == (int(value) if value.isdigit() else value)).scalar()
+            if car_id is None:
+                raise SystemExit(f"Автомобиль не найден: {value}")
+            car_ids.append(car_id)
+        return car_ids
+
+def command_report(args):
+    from reports import REPORTS
+    from batch import BatchReports, init_worker, render_car_reports
+    kinds = args.kinds or list(REPORTS)
+    car_ids = resolve_cars(args.car)
+    os.makedirs(args.out, exist_ok=True)
+    if args.workers > 1:
+        batch = BatchReports(car_ids, args.out, kinds, workers=args.workers)
+        batch.wait()
+        paths, errors = batch.results()
+    else:
+        init_worker()
+        paths, errors = [], []
+        for car_id in car_ids:
+            try:
+                paths += render_car_reports(car_id, args.out, kinds)
+            except Exception as e:
+                errors.append(f"автомобиль {car_id}: {e}")
+    for path in paths:
+        print(path)
+    for error in errors:
+        print(f"Ошибка: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+def command_export(args):
+    from export import export_file
+    car_ids = resolve_cars(args.car) if args.car else [None]
+    if len(car_ids) > 1:
+        raise SystemExit("Выгрузка делается по одному автомобилю или по всему автопарку")
+    count = export_file(args.kind, args.out, car_ids[0])
+    print(f"{args.out}: {count} строк")
+    return 0
+
+def command_due(args):
+    import csv
+    from queries import fetch_due_services
+    car_ids = resolve_cars(args.car) if args.car else None
+    rows = fetch_due_services(date.today() + timedelta(days=args.days), car_ids)
+    header = ["id", "Марка", "Модель", "Номер", "Пробег", "Последнее ТО", "Следующее ТО"]
+    if args.csv:
+        writer = csv.writer(sys.stdout, delimiter=";")
+        writer.writerow(header)
+        writer.writerows(rows)
+    else:
+        for car_id, mark, model, number, mileage, last_service, next_date in rows:
+            print(f"{next_date}  {number:<10} {mark} {model} (id {car_id}), пробег {mileage or 0}, последнее ТО {last_service}")
+    return 0
+
+IMPORT_ERRORS_SHOWN = 50
+
+def command_import(args):
+    from importer import ImportFailed, import_csv
+    try:
+        result = import_csv(args.kind, args.file, args.skip_invalid, args.create_lookups)
+    except ImportFailed as e:
+        raise SystemExit(str(e))
+    for error in result.errors[:IMPORT_ERRORS_SHOWN]:
+        print(f"Ошибка: {error}", file=sys.stderr)
+    if len(result.errors) > IMPORT_ERRORS_SHOWN:
+        print(f"... и еще {len(result.errors) - IMPORT_ERRORS_SHOWN} ошибок", file=sys.stderr)
+    if result.errors and not args.skip_invalid:
+        print(f"Ничего не загружено, строк с ошибками: {len(result.errors)}", file=sys.stderr)
+        return 1
+    print(f"{args.file}: {result.rows} строк, {result.rows_per_second():.0f} строк/с")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Учет автопарка: отчеты, выгрузки и загрузка без графического интерфейса")
+    parser.add_argument("--sql-summary", action="store_true", help="вывести в stderr статистику SQL-запросов")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    report = commands.add_parser("report", help="PDF-отчеты по автомобилям")
+    report.add_argument("--kind", action="append", dest="kinds", choices=["car", "expenses", "schedule"],
+                        help="вид отчета, можно несколько раз; по умолчанию все")
+    report.add_argument("--out", required=True, help="папка для отчетов")
+    report.add_argument("--car", action="append", help="id или госномер, можно несколько раз; по умолчанию весь автопарк")
+    report.add_argument("--workers", type=int, default=1, help="число процессов")
+    report.set_defaults(handler=command_report)
+
+    export = commands.add_parser("export", help="выгрузка ТО или расходов в CSV/XLSX")
+    export.add_argument("kind", choices=["services", "expenses"])
+    export.add_argument("--out", required=True, help="файл .csv или .xlsx")
+    export.add_argument("--car", action="append", help="id или госномер; по умолчанию весь автопарк")
+    export.set_defaults(handler=command_export)
+
+    due = commands.add_parser("due", help="автомобили, которым подходит срок ТО")
+    due.add_argument("--days", type=int, default=30, help="горизонт в днях от сегодняшней даты")
+    due.add_argument("--car", action="append", help="id или госномер; по умолчанию весь автопарк")
+    due.add_argument("--csv", action="store_true", help="вывод в CSV")
+    due.set_defaults(handler=command_due)
+
+    load = commands.add_parser("import", help="массовая загрузка автомобилей, водителей, ТО или расходов из CSV")
+    load.add_argument("kind", choices=["cars", "drivers", "services", "expenses"])
+    load.add_argument("file", help="файл .csv")
+    load.add_argument("--skip-invalid", action="store_true", help="загрузить верные строки, пропустив строки с ошибками")
+    load.add_argument("--create-lookups", action="store_true", help="добавлять в справочники незнакомые статусы и типы")
+    load.set_defaults(handler=command_import)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from migrations import upgrade
+    upgrade()
+    if args.sql_summary:
+        from instrumentation import counter
+    start = time.perf_counter()
+    code = args.handler(args)
+    print(f"Готово за {time.perf_counter() - start:.2f} с", file=sys.stderr)
+    if args.sql_summary:
+        counter.dump()
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
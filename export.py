@@ -0,0 +1,92 @@
+import csv
+import os
+from models import Car, ServiceCar, ExpensesCar, TypeWork, TypeExpenses, session_scope
+
+# Выгрузка ТО и расходов в CSV и XLSX. Строки читаются из курсора на сервере пачками
+# и сразу пишутся в файл, поэтому память не зависит от объема выгрузки
+
+EXPORT_BATCH = 2000
+# Лист XLSX вмещает 1 048 576 строк, дальше выгрузка продолжается на следующем листе
+XLSX_SHEET_ROWS = 1000000
+
+def services_query(scoped, car_id):
+    query = scoped.query(Car.number, Car.mark, Car.model, ServiceCar.date_service, TypeWork.type,
+                         ServiceCar.next_date, ServiceCar.mileage_at_service, ServiceCar.conclusion)\
+        .join(Car, ServiceCar.car_id == Car.car_id)\
+        .outerjoin(TypeWork, ServiceCar.type_work_id == TypeWork.type_work_id)
+    if car_id is not None:
+        query = query.filter(ServiceCar.car_id == car_id)
+    return query.order_by(ServiceCar.car_id, ServiceCar.service_car_id)
+
+def expenses_query(scoped, car_id):
+    query = scoped.query(Car.number, Car.mark, Car.model, TypeExpenses.type_expenses, ExpensesCar.sum, ExpensesCar.date_expenses)\
+        .join(Car, ExpensesCar.car_id == Car.car_id)\
+        .outerjoin(TypeExpenses, ExpensesCar.type_expenses_id == TypeExpenses.type_expenses_id)
+    if car_id is not None:
+        query = query.filter(ExpensesCar.car_id == car_id)
+    return query.order_by(ExpensesCar.car_id, ExpensesCar.expenses_car_id)
+
+# Виды выгрузки: заголовок и запрос; car_id=None - весь автопарк
+EXPORTS = {
+    "services": (["Номер", "Марка", "Модель", "Дата ТО", "Тип работ", "Следующее ТО", "Пробег на момент ТО", "Заключение"], services_query),
+    "expenses": (["Номер", "Марка", "Модель", "Тип расхода", "Сумма", "Дата"], expenses_query),
+}
+
+class ExportCancelled(Exception):
+    pass
+
+# Строки выгрузки; progress(число строк) вызывается после каждой пачки,
+# cancelled() проверяется там же и прерывает выгрузку
+def export_rows(kind, car_id=None, progress=None, cancelled=None):
+    _, query = EXPORTS[kind]
+    with session_scope() as scoped:
+        count = 0
+        for row in query(scoped, car_id).yield_per(EXPORT_BATCH):
+            yield row
+            count += 1
+            if count % EXPORT_BATCH == 0:
+                if cancelled and cancelled():
+                    raise ExportCancelled(f"Выгрузка отменена после {count} строк")
+                if progress:
+                    progress(count)
+        if progress:
+            progress(count)
+
+def export_csv(kind, file_path, car_id=None, progress=None, cancelled=None):
+    header, _ = EXPORTS[kind]
+    count = 0
+    # utf-8-sig и точка с запятой - чтобы Excel открывал файл без мастера импорта
+    with open(file_path, "w", newline="", encoding="utf-8-sig") as file:
+        writer = csv.writer(file, delimiter=";")
+        writer.writerow(header)
+        for row in export_rows(kind, car_id, progress, cancelled):
+            writer.writerow(["" if value is None else value for value in row])
+            count += 1
+    return count
+
+def export_xlsx(kind, file_path, car_id=None, progress=None, cancelled=None):
+    # openpyxl нужен только для XLSX; в режиме write_only строки сбрасываются на диск по мере записи
+    from openpyxl import Workbook
+    header, _ = EXPORTS[kind]
+    workbook = Workbook(write_only=True)
+    count = 0
+    for row in export_rows(kind, car_id, progress, cancelled):
+        if count % XLSX_SHEET_ROWS == 0:
+            sheet = workbook.create_sheet(f"{kind}_{count // XLSX_SHEET_ROWS + 1}")
+            sheet.append(header)
+        sheet.append(list(row))
+        count += 1
+    if not count:
+        workbook.create_sheet(kind).append(header)
+    workbook.save(file_path)
+    return count
+
+# Формат по расширению файла; недописанный файл при отмене или ошибке удаляется
+def export_file(kind, file_path, car_id=None, progress=None, cancelled=None):
+    writer = export_xlsx if file_path.lower().endswith(".xlsx") else export_csv
+    try:
+        return writer(kind, file_path, car_id, progress, cancelled)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
\ No newline at end of file
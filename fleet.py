@@ -0,0 +1,218 @@
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from sqlalchemy import func, text
+from models import (Address, Driver, Car, Status, TypeWork, TypeExpenses, ServiceCar, ExpensesCar,
+                    engine, session_scope)
+from importer import insert_batch
+from migrations import upgrade, drop_schema
+
+# Синтетический автопарк для замеров: автомобили с водителями, история ТО и расходов, фото.
+# Пишет в базу из KURS_DB_URL (Postgres или SQLite) пачками, id назначаются заранее,
+# поэтому связанные строки не требуют обратного чтения
+#   python fleet.py --size 10k [--reset]
+
+FLEET_SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+FLEET_BATCH = 5000
+
+MARKS = {
+    "Lada": ["Vesta", "Granta", "Largus", "Niva"],
+    "Kia": ["Rio", "Ceed", "Sportage"],
+    "Hyundai": ["Solaris", "Creta", "Tucson"],
+    "Skoda": ["Octavia", "Rapid", "Kodiaq"],
+    "Volkswagen": ["Polo", "Tiguan"],
+    "Renault": ["Logan", "Duster", "Kaptur"],
+    "Toyota": ["Camry", "Corolla", "RAV4"],
+    "ГАЗ": ["Газель Next", "Соболь"],
+}
+STATUSES = ["На линии", "В ремонте", "В резерве", "На ТО"]
+TYPE_WORKS = ["ТО-1", "ТО-2", "Замена масла", "Замена колодок", "Шиномонтаж", "Диагностика подвески",
+              "Замена ремня ГРМ", "Замена аккумулятора", "Развал-схождение", "Кузовной ремонт"]
+# Тип расхода, его доля в записях и диапазон суммы
+TYPE_EXPENSES = [("Топливо", 60, (1500, 4500)), ("Мойка", 15, (400, 1200)), ("Парковка", 10, (100, 600)),
+                 ("Штраф", 5, (500, 5000)), ("Запчасти", 7, (2000, 40000)), ("Страховка", 3, (8000, 25000))]
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков", "Федоров",
+            "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров", "Павлов", "Козлов", "Степанов", "Николаев"]
+NAMES = ["Александр", "Сергей", "Дмитрий", "Андрей", "Алексей", "Максим", "Евгений", "Иван", "Михаил", "Артем"]
+MIDDLE_NAMES = ["Александрович", "Сергеевич", "Дмитриевич", "Андреевич", "Иванович", "Михайлович", None]
+CITIES = [("Москва", "Москва"), ("Московская обл.", "Химки"), ("Санкт-Петербург", "Санкт-Петербург"),
+          ("Татарстан", "Казань"), ("Свердловская обл.", "Екатеринбург")]
+STREETS = ["Ленина", "Мира", "Советская", "Гагарина", "Садовая", "Лесная", "Молодежная", "Школьная"]
+CONCLUSIONS = ["Замечаний нет", "Рекомендована замена шин", "Износ колодок 70%", "Течь масла устранена", None]
+PLATE_LETTERS = "АВЕКМНОРСТУХ"
+PLATE_REGIONS = ["77", "97", "99", "177", "197", "50", "750", "78", "16", "66"]
+
+# Фото автомобиля и водителя: JPEG порядка сотни килобайт, как со смартфона после сжатия
+PHOTO_SIZE = (1600, 1200)
+
+def make_photo(rnd, size=PHOTO_SIZE):
+    # Qt нужен только для кодирования фото
+    from PySide6.QtGui import QImage, QPainter, QColor
+    from PySide6.QtCore import QBuffer, QIODevice
+    image = QImage(*size, QImage.Format_RGB32)
+    painter = QPainter(image)
+    for _ in range(1500):
+        painter.fillRect(rnd.randrange(size[0]), rnd.randrange(size[1]), rnd.randrange(8, 300), rnd.randrange(8, 300),
+                         QColor(rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    painter.end()
+    buffer = QBuffer()
+    buffer.open(QIODevice.WriteOnly)
+    image.save(buffer, "JPEG", 85)
+    return buffer.data().data()
+
+# Небольшой набор разных фото, которые повторяются в строках: объем базы как у настоящих
+# фото, а кодирование JPEG не растягивает генерацию
+def photo_pool(rnd, count):
+    from photos import photo_fields
+    return [photo_fields(make_photo(rnd)) for _ in range(count)]
+
+def plate_number(index):
+    letters = len(PLATE_LETTERS)
+    digits, index = index % 999 + 1, index // 999
+    series = [PLATE_LETTERS[(index // letters ** k) % letters] for k in range(3)]
+    region = PLATE_REGIONS[(index // letters ** 3) % len(PLATE_REGIONS)]
+    return f"{series[0]}{digits:03d}{series[1]}{series[2]}{region}"
+
+def next_id(scoped, key):
+    return (scoped.query(func.max(key)).scalar() or 0) + 1
+
+# Справочники: существующие значения переиспользуются, недостающие добавляются
+def ensure_lookups(scoped):
+    ids = {}
+    for model, field, key, names in [(Status, "status", Status.status_id, STATUSES),
+                                     (TypeWork, "type", TypeWork.type_work_id, TYPE_WORKS),
+                                     (TypeExpenses, "type_expenses", TypeExpenses.type_expenses_id, [n for n, _, _ in TYPE_EXPENSES])]:
+        existing = {label: item_id for item_id, label in scoped.query(key, getattr(model, field))}
+        for name in names:
+            if name not in existing:
+                item = model(**{field: name})
+                scoped.add(item)
+                scoped.flush()
+                existing[name] = getattr(item, key.key)
+        ids[model] = [existing[name] for name in names]
+    return ids
+
+class FleetWriter:
+    def __init__(self, scoped, batch=FLEET_BATCH):
+        self.scoped = scoped
+        self.batch = batch
+        self.pending = {}
+        self.counts = {}
+
+    def add(self, model, values):
+        rows = self.pending.setdefault(model, [])
+        rows.append(values)
+        if len(rows) >= self.batch:
+            self.flush()
+
+    # Таблицы сбрасываются в порядке первого добавления, то есть родительские раньше
+    # дочерних: внешние ключи проверяются при вставке
+    def flush(self):
+        for model, rows in self.pending.items():
+            if rows:
+                insert_batch(self.scoped, model, rows)
+                self.counts[model.__tablename__] = self.counts.get(model.__tablename__, 0) + len(rows)
+                self.pending[model] = []
+
+# История одного автомобиля: ТО примерно раз в полгода со следующей датой, расходы
+# равномерно по годам эксплуатации, пробег растет вместе с датами
+def car_history(rnd, writer, car_id, year, mileage, lookups, services, expenses, today):
+    start = date(max(year, today.year - 10), 1, 1)
+    days = max((today - start).days, 1)
+    service_days = sorted(rnd.randrange(days) for _ in range(services))
+    for n, day in enumerate(service_days):
+        service_date = start + timedelta(days=day)
+        writer.add(ServiceCar, {
+            "car_id": car_id,
+            "type_work_id": rnd.choice(lookups[TypeWork]),
+            "date_service": service_date,
+            "next_date": service_date + timedelta(days=rnd.choice([90, 180, 180, 365])),
+            "mileage_at_service": mileage * (n + 1) // (services + 1),
+            "conclusion": rnd.choice(CONCLUSIONS),
+        })
+    weights = [weight for _, weight, _ in TYPE_EXPENSES]
+    for _ in range(expenses):
+        index = rnd.choices(range(len(TYPE_EXPENSES)), weights)[0]
+        low, high = TYPE_EXPENSES[index][2]
+        writer.add(ExpensesCar, {
+            "car_id": car_id,
+            "type_expenses_id": lookups[TypeExpenses][index],
+            "sum": round(rnd.uniform(low, high), 2),
+            "date_expenses": start + timedelta(days=rnd.randrange(days)),
+        })
+
+def generate_fleet(cars, services=20, expenses=30, photo_share=0.1, archived_share=0.05, seed=1, progress=None):
+    rnd = random.Random(seed)
+    today = date.today()
+    start_time = time.perf_counter()
+    with session_scope() as scoped:
+        lookups = ensure_lookups(scoped)
+        photos = photo_pool(rnd, 12) if photo_share > 0 else []
+        writer = FleetWriter(scoped)
+        address_id = next_id(scoped, Address.address_id)
+        driver_id = next_id(scoped, Driver.driver_id)
+        car_id = next_id(scoped, Car.car_id)
+        plate_offset = scoped.query(func.count(Car.car_id)).scalar()
+        for i in range(cars):
+            region, city = rnd.choice(CITIES)
+            writer.add(Address, {"address_id": address_id, "region": region, "city": city, "street": rnd.choice(STREETS),
+                                 "home": rnd.randint(1, 150), "index": rnd.randint(100000, 199999)})
+            photo = rnd.choice(photos) if photos and rnd.random() < photo_share else {}
+            writer.add(Driver, {"driver_id": driver_id, "surname": rnd.choice(SURNAMES), "name": rnd.choice(NAMES),
+                                "middle_name": rnd.choice(MIDDLE_NAMES), "phone": f"+79{rnd.randrange(10 ** 9):09d}",
+                                "experience": rnd.randint(1, 35), "drivers_license_series": rnd.randint(1000, 9999),
+                                "drivers_license_numbers": rnd.randint(100000, 999999), "address_id": address_id,
+                                "photo": photo.get("photo"), "photo_thumb": photo.get("photo_thumb"),
+                                "photo_hash": photo.get("photo_hash")})
+            mark = rnd.choice(list(MARKS))
+            year = rnd.randint(today.year - 12, today.year)
+            mileage = rnd.randint(5000, 40000) * (today.year - year + 1)
+            photo = rnd.choice(photos) if photos and rnd.random() < photo_share else {}
+            writer.add(Car, {"car_id": car_id, "mark": mark, "model": rnd.choice(MARKS[mark]),
+                             "number": plate_number(plate_offset + i), "mileage": mileage, "year": year,
+                             "status_id": rnd.choice(lookups[Status]), "driver_id": driver_id,
+                             "is_archived": rnd.random() < archived_share,
+                             "photo": photo.get("photo"), "photo_thumb": photo.get("photo_thumb"),
+                             "photo_hash": photo.get("photo_hash")})
+            # Число записей у автомобилей разное: от половины до полутора средних
+            car_history(rnd, writer, car_id, year, mileage, lookups,
+                        rnd.randint(services // 2, services * 3 // 2), rnd.randint(expenses // 2, expenses * 3 // 2), today)
+            address_id += 1
+            driver_id += 1
+            car_id += 1
+            if progress and (i + 1) % 1000 == 0:
+                writer.flush()
+                progress(i + 1, writer.counts, time.perf_counter() - start_time)
+        writer.flush()
+        if engine.dialect.name == "postgresql":
+            # id назначались явно, поэтому последовательности догоняются вручную
+            for table, key in [("address", "address_id"), ("driver", "driver_id"), ("car", "car_id"),
+                               ("service_car", "service_car_id"), ("expenses_car", "expenses_car_id")]:
+                scoped.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                                    f"(SELECT coalesce(max({key}), 1) FROM {table}))"))
+    return writer.counts, time.perf_counter() - start_time
+
+def print_progress(cars, counts, elapsed):
+    rows = sum(counts.values())
+    print(f"{cars} автомобилей, {rows} строк, {elapsed:.0f} с ({rows / elapsed:.0f} строк/с)", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Синтетический автопарк для замеров производительности")
+    parser.add_argument("--size", choices=list(FLEET_SIZES), default="1k", help="число автомобилей")
+    parser.add_argument("--cars", type=int, help="точное число автомобилей вместо --size")
+    parser.add_argument("--services", type=int, default=20, help="среднее число ТО на автомобиль")
+    parser.add_argument("--expenses", type=int, default=30, help="среднее число расходов на автомобиль")
+    parser.add_argument("--photo-share", type=float, default=0.1, help="доля автомобилей и водителей с фото")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--reset", action="store_true", help="удалить и заново создать все таблицы перед генерацией")
+    args = parser.parse_args()
+    if args.reset:
+        drop_schema()
+    upgrade()
+    counts, elapsed = generate_fleet(args.cars or FLEET_SIZES[args.size], args.services, args.expenses,
+                                     args.photo_share, seed=args.seed, progress=print_progress)
+    for table, count in counts.items():
+        print(f"{table}: {count}")
+    print(f"Готово за {elapsed:.1f} с")
\ No newline at end of file
@@ -0,0 +1,227 @@
+import csv
+import io
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from models import Car, Driver, ServiceCar, ExpensesCar, Status, TypeWork, TypeExpenses, engine, session_scope
+from lookups import LOOKUPS, lookup_cache
+
+# Массовая загрузка из CSV (разделитель ";" или ",", первая строка - имена колонок).
+# Строки проверяются и вставляются пачками в одной транзакции: при ошибках в данных
+# не загружается ничего, если не разрешено пропускать неверные строки
+
+IMPORT_BATCH = 5000
+
+class ImportFailed(Exception):
+    pass
+
+def parse_int(value):
+    if not value.lstrip("-").isdigit():
+        raise ValueError(f"ожидается целое число, получено '{value}'")
+    return int(value)
+
+def parse_float(value):
+    try:
+        return float(value.replace(",", "."))
+    except ValueError:
+        raise ValueError(f"ожидается число, получено '{value}'")
+
+def parse_date(value):
+    for fmt in ("%Y-%m-%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise ValueError(f"неверная дата '{value}', ожидается ГГГГ-ММ-ДД или ДД.ММ.ГГГГ")
+
+def parse_bool(value):
+    return value.strip().lower() in ("1", "true", "yes", "да")
+
+def parse_number(value):
+    if len(value) > 9:
+        raise ValueError("госномер длиннее 9 символов")
+    return value
+
+def parse_digits(length):
+    def parse(value):
+        if not value.isdigit() or len(value) != length:
+            raise ValueError(f"ожидается {length} цифр")
+        return int(value)
+    return parse
+
+# Колонка CSV: (имя в файле, поле таблицы, разбор значения, обязательная, справочник для поиска id по названию)
+IMPORTS = {
+    "drivers": (Driver, [
+        ("surname", "surname", str, True, None),
+        ("name", "name", str, True, None),
+        ("middle_name", "middle_name", str, False, None),
+        ("phone", "phone", str, True, None),
+        ("experience", "experience", parse_int, False, None),
+        ("license_series", "drivers_license_series", parse_digits(4), True, None),
+        ("license_number", "drivers_license_numbers", parse_digits(6), True, None),
+    ]),
+    "cars": (Car, [
+        ("mark", "mark", str, True, None),
+        ("model", "model", str, True, None),
+        ("number", "number", parse_number, True, None),
+        ("mileage", "mileage", parse_int, True, None),
+        ("year", "year", parse_int, True, None),
+        ("status", "status_id", str, True, "status"),
+        ("driver", "driver_id", str, False, "driver"),
+        ("is_archived", "is_archived", parse_bool, False, None),
+    ]),
+    "services": (ServiceCar, [
+        ("car", "car_id", str, True, "car"),
+        ("date_service", "date_service", parse_date, True, None),
+        ("type_work", "type_work_id", str, True, "type_work"),
+        ("next_date", "next_date", parse_date, False, None),
+        ("mileage_at_service", "mileage_at_service", parse_int, False, None),
+        ("conclusion", "conclusion", str, False, None),
+    ]),
+    "expenses": (ExpensesCar, [
+        ("car", "car_id", str, True, "car"),
+        ("type_expenses", "type_expenses_id", str, True, "type_expenses"),
+        ("sum", "sum", parse_float, True, None),
+        ("date_expenses", "date_expenses", parse_date, True, None),
+    ]),
+}
+
+# Справочники, недостающие значения которых можно создать при загрузке
+CREATABLE = {"status": (Status, "status"), "type_work": (TypeWork, "type"), "type_expenses": (TypeExpenses, "type_expenses")}
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+# Название, которому соответствует несколько записей (однофамильцы с одинаковым именем,
+# повторяющийся госномер): такая строка не загружается, вместо названия нужен id
+AMBIGUOUS = object()
+# Справочники, запись которых можно указать и числовым id
+BY_ID = ("driver", "car")
+
+# Поиск id по названию: справочники из кэша, автомобили по госномеру
+class Resolver:
+    def __init__(self, scoped, create_missing):
+        self.scoped = scoped
+        self.create_missing = create_missing
+        self.maps = {}
+        self.ids = {}
+
+    def load(self, name):
+        if name == "car":
+            rows = [(car_id, number) for car_id, number in self.scoped.query(Car.car_id, Car.number) if number]
+        else:
+            rows = lookup_cache.get(name)
+        mapping = {}
+        for item_id, label in rows:
+            key = label.strip().lower()
+            mapping[key] = AMBIGUOUS if key in mapping else item_id
+        self.maps[name] = mapping
+        self.ids[name] = {item_id for item_id, _ in rows}
+
+    def resolve(self, name, text):
+        if name not in self.maps:
+            self.load(name)
+        key = text.strip().lower()
+        if name in BY_ID and key.isdigit():
+            if int(key) not in self.ids[name]:
+                raise ValueError(f"не найден id {key} в справочнике {name}")
+            return int(key)
+        item_id = self.maps[name].get(key)
+        if item_id is AMBIGUOUS:
+            raise ValueError(f"неоднозначное значение '{text}' в справочнике {name}, укажите id")
+        if item_id is None and self.create_missing and name in CREATABLE:
+            model, field = CREATABLE[name]
+            item = model(**{field: text.strip()})
+            self.scoped.add(item)
+            self.scoped.flush()
+            item_id = getattr(item, LOOKUPS[name][1].key)
+            self.maps[name][key] = item_id
+        if item_id is None:
+            raise ValueError(f"не найдено значение '{text}' в справочнике {name}")
+        return item_id
+
+def parse_row(columns, row, resolver):
+    values = {}
+    for column, field, parse, required, lookup in columns:
+        text = (row.get(column) or "").strip()
+        if not text:
+            if required:
+                raise ValueError(f"не заполнена колонка {column}")
+            # Пустой признак архива - действующий автомобиль, как при добавлении через форму
+            values[field] = False if parse is parse_bool else None
+            continue
+        try:
+            value = parse(text)
+            values[field] = resolver.resolve(lookup, value) if lookup else value
+        except ValueError as e:
+            raise ValueError(f"{column}: {e}")
+    return values
+
+def open_csv(file):
+    sample = file.read(4096)
+    file.seek(0)
+    delimiter = ";" if sample.count(";") >= sample.count(",") else ","
+    return csv.DictReader(file, delimiter=delimiter)
+
+# Значение поля в CSV для COPY: NULL - пустое поле, bytea - в шестнадцатеричном виде
+def copy_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return "\\x" + value.hex()
+    return value
+
+# Вставка пачки: COPY для PostgreSQL на psycopg2, иначе executemany
+def insert_batch(scoped, model, batch):
+    connection = scoped.connection()
+    if engine.dialect.name == "postgresql" and engine.dialect.driver == "psycopg2":
+        fields = list(batch[0])
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in batch:
+            writer.writerow([copy_value(values[field]) for field in fields])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(f"COPY {model.__tablename__} ({', '.join(fields)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    else:
+        connection.execute(insert(model.__table__), batch)
+
+def import_csv(kind, file_path, skip_invalid=False, create_missing=False, progress=None):
+    model, columns = IMPORTS[kind]
+    result = ImportResult()
+    start = time.perf_counter()
+    with open(file_path, newline="", encoding="utf-8-sig") as file, session_scope() as scoped:
+        reader = open_csv(file)
+        missing = [column for column, _, _, required, _ in columns if required and column not in (reader.fieldnames or [])]
+        if missing:
+            raise ImportFailed(f"В файле нет колонок: {', '.join(missing)}")
+        resolver = Resolver(scoped, create_missing)
+        batch = []
+        for line, row in enumerate(reader, start=2):
+            try:
+                batch.append(parse_row(columns, row, resolver))
+            except ValueError as e:
+                result.errors.append(f"строка {line}: {e}")
+                continue
+            if len(batch) >= IMPORT_BATCH:
+                insert_batch(scoped, model, batch)
+                result.rows += len(batch)
+                batch = []
+                if progress:
+                    progress(result.rows)
+        if batch:
+            insert_batch(scoped, model, batch)
+            result.rows += len(batch)
+        if result.errors and not skip_invalid:
+            scoped.rollback()
+            result.rows = 0
+    # Core-вставки не проходят через flush сессии, поэтому справочники сбрасываются явно
+    lookup_cache.invalidate()
+    result.elapsed = time.perf_counter() - start
+    return result
\ No newline at end of file
@@ -0,0 +1,177 @@
+import atexit
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from models import engine
+import config
+
+# Журнал медленных запросов; без настроенных обработчиков logging пишет предупреждения в stderr
+slow_log = logging.getLogger("kurs.sql.slow")
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class ActionFrame:
+    def __init__(self, action):
+        self.action = action
+        self.count = 0
+        self.elapsed = 0.0
+        self.statements = []
+
+# Накопленная статистика по тексту запроса или по действию пользователя
+class Stats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.queries = 0
+
+    def add(self, elapsed, rows=0, queries=1):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.rows += rows
+        self.queries += queries
+
+# Курсор-обертка для драйверов, которые не сообщают rowcount для SELECT (sqlite3,
+# серверные курсоры): строки считаются по мере чтения результата
+class CountingCursor:
+    def __init__(self, cursor, stats):
+        self.cursor = cursor
+        self.stats = stats
+
+    def fetchone(self):
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.stats.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.cursor.fetchmany(*args)
+        self.stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.cursor.fetchall()
+        self.stats.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+# Параметры в тексте IN (...) после раскрытия expanding-параметров сворачиваются,
+# чтобы запросы с разным числом id попадали в одну строку сводки
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%\(\w+\)s|:\w+)\s*\)")
+
+def normalize(statement):
+    return _IN_LIST.sub("(...)", " ".join(statement.split()))
+
+# Подсчет SQL-запросов, выполненных в рамках действия пользователя, и статистика
+# по событиям движка: время каждого запроса, число строк и медленные запросы
+class QueryCounter:
+    def __init__(self, slow_ms=200):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.slow_ms = slow_ms
+        self.statements = {}
+        self.actions = {}
+        self.unattributed = Stats()
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        for frame in self.stack():
+            frame.count += 1
+            frame.statements.append(statement)
+
+    def on_start(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def on_executed(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        rows = max(cursor.rowcount, 0)
+        stack = self.stack()
+        action = stack[-1].action if stack else None
+        for frame in stack:
+            frame.elapsed += elapsed
+        with self.lock:
+            stats = self.statements.setdefault(normalize(statement), Stats())
+            stats.add(elapsed, rows)
+            if action is None:
+                self.unattributed.add(elapsed, rows)
+        # Результат еще не прочитан: для SELECT без rowcount строки досчитываются при чтении
+        if cursor.rowcount < 0 and cursor.description is not None and context is not None:
+            context.cursor = CountingCursor(cursor, stats)
+        if elapsed * 1000 >= self.slow_ms:
+            slow_log.warning("%.1f мс, действие %s: %s", elapsed * 1000, action or "-", " ".join(statement.split()))
+
+    def on_error(self, context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    def finish_action(self, frame):
+        with self.lock:
+            stats = self.actions.setdefault(frame.action, Stats())
+            stats.add(frame.elapsed, queries=frame.count)
+
+    def reset(self):
+        with self.lock:
+            self.statements.clear()
+            self.actions.clear()
+            self.unattributed = Stats()
+
+    # Текстовая сводка: действия по числу запросов и самые долгие запросы по суммарному времени
+    def summary(self, top=20):
+        with self.lock:
+            actions = sorted(self.actions.items(), key=lambda item: item[1].queries, reverse=True)
+            statements = sorted(self.statements.items(), key=lambda item: item[1].total, reverse=True)[:top]
+            unattributed = self.unattributed
+        lines = ["Действия: запусков, запросов всего / на запуск, время в запросах"]
+        for action, stats in actions:
+            lines.append(f"  {action}: {stats.count}, {stats.queries} / {stats.queries / stats.count:.1f}, {stats.total * 1000:.1f} мс")
+        if unattributed.count:
+            lines.append(f"  вне действий: {unattributed.count} запросов, {unattributed.total * 1000:.1f} мс")
+        lines.append(f"Запросы (первые {top} по суммарному времени): выполнений, всего, среднее, максимум, строк")
+        for statement, stats in statements:
+            lines.append(f"  {stats.count}, {stats.total * 1000:.1f} мс, {stats.total * 1000 / stats.count:.2f} мс, "
+                         f"{stats.max * 1000:.1f} мс, {stats.rows}: {statement[:200]}")
+        return "\n".join(lines)
+
+    def dump(self, file=None):
+        print(self.summary(), file=file or sys.stderr)
+
+counter = QueryCounter(config.SLOW_QUERY_MS)
+event.listen(engine, "before_cursor_execute", counter.on_execute)
+# KURS_SQL_STATS=0 отключает замеры; счетчик бюджетов работает в любом случае
+if config.SQL_STATS:
+    event.listen(engine, "before_cursor_execute", counter.on_start)
+    event.listen(engine, "after_cursor_execute", counter.on_executed)
+    event.listen(engine, "handle_error", counter.on_error)
+# KURS_SQL_SUMMARY=1 - сводка в stderr при завершении процесса
+if config.SQL_SUMMARY:
+    atexit.register(counter.dump)
+
+# Бюджет запросов на действие; годится и как декоратор метода
+@contextmanager
+def query_budget(action, max_queries):
+    frame = ActionFrame(action)
+    stack = counter.stack()
+    stack.append(frame)
+    try:
+        yield frame
+    finally:
+        stack.remove(frame)
+        if config.SQL_STATS:
+            counter.finish_action(frame)
+    # Проверка бюджетов включается в тестах: KURS_QUERY_BUDGET=1
+    if config.QUERY_BUDGET and frame.count > max_queries:
+        raise QueryBudgetExceeded(f"{action}: {frame.count} запросов при бюджете {max_queries}\n" + "\n".join(frame.statements))
\ No newline at end of file
@@ -0,0 +1,71 @@
+import time
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from models import Status, Driver, TypeWork, TypeExpenses, session_scope
+
+# Справочники: класс модели, первичный ключ и функция подписи для выпадающих списков
+LOOKUPS = {
+    "status": (Status, Status.status_id, (Status.status,), lambda row: row.status),
+    "driver": (Driver, Driver.driver_id, (Driver.surname, Driver.name), lambda row: f"{row.surname} {row.name}"),
+    "type_work": (TypeWork, TypeWork.type_work_id, (TypeWork.type,), lambda row: row.type),
+    "type_expenses": (TypeExpenses, TypeExpenses.type_expenses_id, (TypeExpenses.type_expenses,), lambda row: row.type_expenses),
+}
+
+# Общий для процесса кэш справочников. Справочник сбрасывается, когда приложение само
+# пишет в него, или когда меняется его штамп версии (число строк и максимальный id)
+class LookupCache:
+    def __init__(self, stamp_interval=30):
+        self.stamp_interval = stamp_interval
+        self.data = {}
+        self.stamps = {}
+        self.checked_at = None
+        event.listen(Session, "after_flush", self._after_flush)
+
+    def get(self, name):
+        self._check_stamp()
+        if name not in self.data:
+            model, key, columns, label = LOOKUPS[name]
+            with session_scope() as scoped:
+                self.data[name] = [(row[0], label(row)) for row in scoped.query(key, *columns).order_by(key)]
+        return self.data[name]
+
+    # Id записи справочника по подписи, без учета регистра
+    def find(self, name, text):
+        text = text.strip().lower()
+        for item_id, label in self.get(name):
+            if label.lower() == text:
+                return item_id
+        return None
+
+    def invalidate(self, *names):
+        for name in names or list(self.data):
+            self.data.pop(name, None)
+
+    # Штампы всех справочников одним запросом
+    def version_stamps(self):
+        columns = []
+        for model, key, _, _ in LOOKUPS.values():
+            columns += [select(func.count()).select_from(model).scalar_subquery(), select(func.max(key)).scalar_subquery()]
+        with session_scope() as scoped:
+            row = scoped.execute(select(*columns)).one()
+        return {name: tuple(row[2 * i:2 * i + 2]) for i, name in enumerate(LOOKUPS)}
+
+    def _check_stamp(self):
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.stamp_interval:
+            return
+        stamps = self.version_stamps()
+        for name, stamp in stamps.items():
+            if self.stamps.get(name) != stamp:
+                self.data.pop(name, None)
+        self.stamps = stamps
+        self.checked_at = now
+
+    def _after_flush(self, flush_session, flush_context):
+        changed = set(flush_session.new) | set(flush_session.dirty) | set(flush_session.deleted)
+        for name, (model, _, _, _) in LOOKUPS.items():
+            if any(isinstance(instance, model) for instance in changed):
+                self.data.pop(name, None)
+                self.checked_at = None
+
+lookup_cache = LookupCache()
\ No newline at end of file
@@ -1,24 +1,92 @@
+import os
+import threading
+from functools import partial
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QDialog, 
-                              QLabel, QLineEdit, QComboBox, QListWidget, QListWidgetItem, QTableWidget, 
-                              QTableWidgetItem, QDateEdit, QFileDialog)
-from PySide6.QtGui import QIcon, QIntValidator, QDoubleValidator
-from PySide6.QtCore import Qt, QDate
-from models import Car, Driver, Status, ExpensesCar, ServiceCar, TypeWork, TypeExpenses, Address, session
+                              QLabel, QLineEdit, QComboBox, QListWidget, QListWidgetItem, QTableView, 
+                              QDateEdit, QFileDialog, QCompleter, QProgressBar,
+                              QCheckBox)
+from PySide6.QtGui import QIcon, QIntValidator, QDoubleValidator, QStandardItemModel, QStandardItem, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, QDate, QTimer, QModelIndex
+from models import Car, Driver, Address, session
 from styles import StyleHelper
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.graphics.shapes import Drawing, Line, String
-from reportlab.lib.styles import getSampleStyleSheet
-from utils import load_photo, select_photo, show_message
+from navigation import CarCursor
+from search import CarSearch
+from instrumentation import query_budget, counter
+from queries import (fetch_services, fetch_expenses, fetch_archived_cars, fetch_active_cars, fetch_first_cars,
+                     fetch_car_page, fetch_car, fetch_service, fetch_expense, archive_car, unarchive_car,
+                     remove_driver, write_car, write_driver, write_service, write_expense)
+from workers import run_in_background, show_error
+from table_models import PagedTableModel, format_date, format_text, format_sum
+# Отчеты (ReportLab), пакетная генерация и выгрузка импортируются при первом обращении,
+# чтобы не замедлять запуск приложения
+from utils import load_photo, load_entity_photo, prefetch_entity_photo, select_photo, show_message, fill_combo
+from photos import photo_fields
+
+ICON_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_icon.png")
+
+# Значения полей водителя из формы
+def driver_fields(inputs):
+    return {
+        "surname": inputs["surname"].text(),
+        "name": inputs["name"].text(),
+        "middle_name": inputs["middle_name"].text() or None,
+        "phone": inputs["phone"].text(),
+        "experience": int(inputs["experience"].text()) if inputs["experience"].text() else None,
+        "drivers_license_series": inputs["series"].text(),
+        "drivers_license_numbers": inputs["number"].text(),
+    }
+
+def address_fields(address_inputs):
+    values = {key: address_inputs[key].text() for key in address_inputs}
+    return {
+        "region": values["region"] or None,
+        "city": values["city"] or None,
+        "street": values["street"] or None,
+        "home": int(values["home"]) if values["home"] else None,
+        "index": int(values["index"]) if values["index"] else None,
+    }
+
+# Значения полей автомобиля из формы
+def car_fields(inputs, status_combo, driver_combo):
+    return {
+        "mark": inputs["mark"].text(),
+        "model": inputs["model"].text(),
+        "number": inputs["number"].text(),
+        "mileage": int(inputs["mileage"].text()),
+        "year": int(inputs["year"].text()),
+        "status_id": status_combo.currentData(),
+        "driver_id": driver_combo.currentData(),
+    }
+
+# Значения полей ТО и расхода из диалогов добавления и редактирования
+def service_fields(dialog):
+    return {
+        "mileage_at_service": int(dialog.mileage_input.text()),
+        "type_work_id": dialog.type_work_combo.currentData(),
+        "date_service": dialog.date_input.date().toPython(),
+        "next_date": dialog.next_date_input.date().toPython(),
+        "conclusion": dialog.conclusion_input.text() or None,
+    }
+
+def expense_fields(dialog):
+    return {
+        "type_expenses_id": dialog.type_expenses_combo.currentData(),
+        "sum": float(dialog.sum_input.text()),
+        "date_expenses": dialog.date_input.date().toPython(),
+    }
+
+# Сброс объекта в сессии GUI после записи из фоновой задачи
+def expire_cached(model, object_id):
+    instance = session.identity_map.get(session.identity_key(model, object_id))
+    if instance is not None:
+        session.expire(instance)
 
 # Класс карточки автомобиля
 class CarCard(QWidget):
     def __init__(self, car, parent=None):
         super().__init__(parent)
         self.car = car
+        self.car_id = None
         self.parent_widget = parent
         StyleHelper.apply_widget_style(self, "background-color: #fff9e6; border-radius: 15px; padding: 15px; border: 2px solid #ffd700;")
         self.setFixedSize(750, 400)
@@ -28,9 +96,9 @@ class CarCard(QWidget):
         self.info_layout = QVBoxLayout()
         self.info_widget = QWidget()
         self.info_sub_layout = QVBoxLayout(self.info_widget)
-        self.info = QLabel(f"Номер: {car.number}\nПробег: {car.mileage} км\nГод: {car.year}\nСтатус: {car.status.status}")
-        self.driver = car.driver
-        self.driver_info = QLabel(f"Водитель: {self.driver.surname} {self.driver.name} {self.driver.middle_name}" if self.driver else "Водитель: Не назначен")
+        self.info = QLabel()
+        self.driver = None
+        self.driver_info = QLabel()
         self.driver_info.setCursor(Qt.PointingHandCursor)
         self.driver_info.mousePressEvent = self.show_driver_info
         StyleHelper.apply_widget_style(self.info)
@@ -46,7 +114,6 @@ class CarCard(QWidget):
 
         self.right_layout = QVBoxLayout()
         self.photo_label = QLabel()
-        load_photo(self.car.photo, self.photo_label)
         self.right_layout.addWidget(self.photo_label, alignment=Qt.AlignCenter)
 
         self.nav_layout = QHBoxLayout()
@@ -63,14 +130,25 @@ class CarCard(QWidget):
         self.main_layout.setStretch(0, 4)
         self.main_layout.setStretch(1, 6)
         self.setLayout(self.main_layout)
+        if car is not None:
+            self.set_car(car)
 
-    # Обновление данных карточки
-    def update_card(self):
-        self.car = session.query(Car).get(self.car.car_id)
-        self.info.setText(f"Номер: {self.car.number}\nПробег: {self.car.mileage} км\nГод: {self.car.year}\nСтатус: {self.car.status.status}")
-        self.driver = self.car.driver
+    # Привязка карточки к другому автомобилю без пересоздания виджетов
+    def set_car(self, car):
+        self.car = car
+        self.car_id = car.car_id
+        self.info.setText(f"Номер: {car.number}\nПробег: {car.mileage} км\nГод: {car.year}\nСтатус: {car.status.status}")
+        self.driver = car.driver
         self.driver_info.setText(f"Водитель: {self.driver.surname} {self.driver.name} {self.driver.middle_name}" if self.driver else "Водитель: Не назначен")
-        load_photo(self.car.photo, self.photo_label)
+        load_entity_photo(car, self.photo_label)
+
+    # Обновление данных карточки: автомобиль перечитывается в фоне и переносится в сессию GUI
+    def update_card(self):
+        run_in_background(fetch_car, self.car_id, on_done=self.show_updated_car)
+
+    def show_updated_car(self, car):
+        if car is not None and self.car is not None and car.car_id == self.car_id:
+            self.set_car(session.merge(car, load=False))
 
     def show_driver_info(self, event):
         if self.driver:
@@ -79,10 +157,11 @@ class CarCard(QWidget):
 
 # Главное окно приложения
 class MainWindow(QMainWindow):
+    @query_budget("open MainWindow", 0)
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Учет автопарка")
-        self.setWindowIcon(QIcon("car_icon.png"))
+        self.setWindowIcon(QIcon(ICON_FILE))
         self.setFixedSize(800, 650)
 
         self.main_widget = QWidget()
@@ -100,10 +179,24 @@ class MainWindow(QMainWindow):
         self.search_btn = QPushButton("Найти")
         StyleHelper.apply_button_style(self.search_btn, extra="min-width: 100px;")
         self.search_btn.clicked.connect(self.search_car)
+        self.search_input.returnPressed.connect(self.search_car)
         self.search_layout.addWidget(self.search_input)
         self.search_layout.addWidget(self.search_btn)
         self.layout.addLayout(self.search_layout)
 
+        # Поиск по мере ввода: запрос уходит после паузы в наборе
+        self.search = CarSearch(session)
+        self.search_results = QStandardItemModel(self)
+        self.completer = QCompleter(self.search_results, self)
+        self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.completer.setWidget(self.search_input)
+        self.completer.activated[QModelIndex].connect(self.open_search_result)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.update_search_results)
+        self.search_input.textEdited.connect(self.search_timer.start)
+
         self.car_title = QPushButton("")
         StyleHelper.apply_title_style(self.car_title)
         self.car_title.clicked.connect(self.show_service_expenses)
@@ -112,89 +205,212 @@ class MainWindow(QMainWindow):
         self.card_container = QWidget()
         self.card_layout = QVBoxLayout(self.card_container)
         self.card_container.setFixedSize(750, 450)
-        self.cars = session.query(Car).filter_by(is_archived=False).all()
-        self.current_car_index = 0
-        self.load_current_car()
+        # Карточка создается один раз и при навигации только перепривязывается к автомобилю
+        self.card = CarCard(None, self)
+        self.card.left_btn.clicked.connect(self.prev_car)
+        self.card.right_btn.clicked.connect(self.next_car)
+        self.card.edit_btn.clicked.connect(lambda: self.edit_car(self.card))
+        self.card_layout.addWidget(self.card, alignment=Qt.AlignCenter)
+        self.empty_label = QLabel("Загрузка...")
+        StyleHelper.apply_widget_style(self.empty_label)
+        self.card_layout.addWidget(self.empty_label, alignment=Qt.AlignCenter)
+        self.retry_btn = QPushButton("Повторить")
+        StyleHelper.apply_button_style(self.retry_btn)
+        self.retry_btn.clicked.connect(self.load_first_cars)
+        self.card_layout.addWidget(self.retry_btn, alignment=Qt.AlignCenter)
+        self.retry_btn.hide()
+        self.card.hide()
+        # Окно показывается сразу, первая страница автомобилей загружается в фоне
+        self.cursor = CarCursor(session)
+        self.page_generation = 0
+        self.page_loading = False
+        self.load_first_cars()
         self.layout.addWidget(self.card_container, alignment=Qt.AlignCenter)
 
         self.btn_layout = QHBoxLayout()
         self.add_btn = QPushButton("Добавить автомобиль")
         self.archive_btn = QPushButton("Архив")
+        self.batch_btn = QPushButton("Отчёты по автопарку")
+        self.export_btn = QPushButton("Выгрузка")
         StyleHelper.apply_button_style(self.add_btn, extra="min-width: 200px;")
         StyleHelper.apply_button_style(self.archive_btn, extra="min-width: 200px;")
+        StyleHelper.apply_button_style(self.batch_btn, extra="min-width: 150px;")
+        StyleHelper.apply_button_style(self.export_btn, extra="min-width: 150px;")
         self.add_btn.clicked.connect(self.add_car)
         self.archive_btn.clicked.connect(self.show_archive)
+        self.batch_btn.clicked.connect(self.show_batch_reports)
+        self.export_btn.clicked.connect(self.show_export)
         self.btn_layout.addWidget(self.add_btn)
         self.btn_layout.addWidget(self.archive_btn)
+        self.btn_layout.addWidget(self.batch_btn)
+        self.btn_layout.addWidget(self.export_btn)
         self.layout.addLayout(self.btn_layout)
 
         self.layout.addStretch()
 
+        # Сводка SQL-статистики в stderr по запросу
+        self.sql_summary_shortcut = QShortcut(QKeySequence("Ctrl+Shift+Q"), self)
+        self.sql_summary_shortcut.activated.connect(counter.dump)
+
+    # Автомобили из фоновой сессии переносятся в сессию GUI без повторного запроса
+    def load_first_cars(self):
+        self.retry_btn.hide()
+        self.empty_label.setText("Загрузка...")
+        run_in_background(fetch_first_cars, self.cursor.window, on_done=self.show_first_cars,
+                          on_error=self.first_cars_failed)
+
+    def show_first_cars(self, cars):
+        if not cars:
+            self.empty_label.setText("Нет автомобилей")
+        if self.cursor.current() is None:
+            self.cursor.first([session.merge(car, load=False) for car in cars])
+            self.load_current_car()
+            self.load_neighbour_page()
+
+    def first_cars_failed(self, text):
+        self.empty_label.setText("Не удалось загрузить автомобили")
+        self.retry_btn.show()
+        show_error(text)
+
     # Загрузка текущей карточки автомобиля
     def load_current_car(self):
-        for i in reversed(range(self.card_layout.count())):
-            self.card_layout.itemAt(i).widget().setParent(None)
-        if self.cars and 0 <= self.current_car_index < len(self.cars):
-            self.card = CarCard(self.cars[self.current_car_index], self)
-            self.card_layout.addWidget(self.card, alignment=Qt.AlignCenter)
-            self.car_title.setText(f"{self.cars[self.current_car_index].mark} {self.cars[self.current_car_index].model}")
-            self.card.left_btn.clicked.connect(self.prev_car)
-            self.card.right_btn.clicked.connect(self.next_car)
-            self.card.edit_btn.clicked.connect(lambda: self.edit_car(self.card))
+        car = self.cursor.current()
+        if car:
+            self.card.set_car(car)
+            self.card.show()
+            self.empty_label.hide()
+            self.car_title.setText(f"{car.mark} {car.model}")
+            # Фото соседей декодируются после отрисовки текущей карточки
+            QTimer.singleShot(0, self.prefetch_neighbours)
         else:
-            label = QLabel("Нет автомобилей")
-            StyleHelper.apply_widget_style(label)
-            self.card_layout.addWidget(label, alignment=Qt.AlignCenter)
+            self.card.hide()
+            self.empty_label.setText("Нет автомобилей")
+            self.empty_label.show()
             self.car_title.setText("Нет автомобилей")
 
+    def prefetch_neighbours(self):
+        for car in self.cursor.neighbours():
+            prefetch_entity_photo(car)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Left:
+            self.prev_car()
+        elif event.key() == Qt.Key_Right:
+            self.next_car()
+        else:
+            super().keyPressEvent(event)
+
+    # Переход внутри загруженного окна; соседние страницы и переход по кругу загружаются в фоне.
+    # В GUI-потоке остается только фото карточки, если его нет в кэше: миниатюра и оригинал
+    @query_budget("navigate cars", 2)
     def prev_car(self):
-        if self.cars:
-            self.current_car_index = (self.current_car_index - 1) % len(self.cars)
+        if self.cursor.prev(load=False):
             self.load_current_car()
+        self.load_neighbour_page()
 
+    @query_budget("navigate cars", 2)
     def next_car(self):
-        if self.cars:
-            self.current_car_index = (self.current_car_index + 1) % len(self.cars)
+        if self.cursor.next(load=False):
             self.load_current_car()
+        self.load_neighbour_page()
+
+    # Страница курсора в фоне; новая страница окна (поиск, сохранение) отменяет загружаемую
+    def request_page(self, direction, car_id=None):
+        self.page_generation += 1
+        self.page_loading = True
+        generation = self.page_generation
+        run_in_background(fetch_car_page, self.cursor.archived, direction, car_id, self.cursor.window,
+                          on_done=lambda cars: self.add_car_page(generation, direction, car_id, cars),
+                          on_error=lambda text: self.car_page_failed(generation, text))
+
+    def load_neighbour_page(self):
+        page = self.cursor.pending_page()
+        if page and not self.page_loading:
+            self.request_page(*page)
+
+    def add_car_page(self, generation, direction, car_id, cars):
+        if generation != self.page_generation:
+            return
+        self.page_loading = False
+        self.cursor.add_page(direction, car_id, [session.merge(car, load=False) for car in cars])
+        if direction not in ("after", "before"):
+            self.load_current_car()
+        self.load_neighbour_page()
+
+    def car_page_failed(self, generation, text):
+        if generation == self.page_generation:
+            self.page_loading = False
+        show_error(text)
+
+    # Окно вокруг текущего автомобиля заново, например после восстановления из архива
+    def reload_cars(self):
+        car = self.cursor.current()
+        self.request_page("around", car.car_id) if car else self.request_page("first")
 
     def add_car(self):
         dialog = AddCarDialog()
         if dialog.exec():
-            self.cars = session.query(Car).filter_by(is_archived=False).all()
-            self.current_car_index = len(self.cars) - 1
-            self.load_current_car()
+            self.search.invalidate()
+            self.request_page("last")
 
     def edit_car(self, card):
         dialog = EditCarDialog(card.car)
         if dialog.exec():
-            self.cars = session.query(Car).filter_by(is_archived=False).all()
-            self.current_car_index = self.cars.index(session.query(Car).get(card.car.car_id)) if card.car in self.cars else 0
-            self.load_current_car()
+            self.search.invalidate()
+            if dialog.archived:
+                self.request_page("first")
+            else:
+                self.request_page("around", dialog.car_id)
 
     def show_service_expenses(self):
-        if self.cars and 0 <= self.current_car_index < len(self.cars):
-            dialog = CarServiceExpensesDialog(self.cars[self.current_car_index])
+        car = self.cursor.current()
+        if car:
+            dialog = CarServiceExpensesDialog(car, self)
             dialog.exec()
 
     def show_archive(self):
         dialog = ArchiveDialog(self)
         dialog.exec()
 
+    def show_batch_reports(self):
+        dialog = BatchReportDialog(self)
+        dialog.exec()
+
+    def show_export(self):
+        dialog = ExportDialog(self)
+        dialog.exec()
+
+    def update_search_results(self):
+        self.search_results.clear()
+        query = self.search_input.text().strip()
+        for hit in (self.search.search(query) if len(query) >= 2 else []):
+            item = QStandardItem(f"{hit.title} ({hit.number})")
+            item.setData(hit.car_id, Qt.UserRole)
+            self.search_results.appendRow(item)
+        if self.search_results.rowCount():
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+
+    def open_search_result(self, index):
+        self.request_page("around", index.data(Qt.UserRole))
+
     def search_car(self):
-        query = self.search_input.text().strip().lower()
+        query = self.search_input.text().strip()
         if not query:
             show_message("Ошибка", "Введите запрос для поиска!", "warning")
             return
-        for i, car in enumerate(self.cars):
-            if query in car.number.lower() or query in f"{car.mark} {car.model}".lower():
-                self.current_car_index = i
-                self.load_current_car()
-                return
+        self.search_timer.stop()
+        self.completer.popup().hide()
+        hits = self.search.search(query, limit=1)
+        if hits:
+            self.request_page("around", hits[0].car_id)
+            return
         show_message("Увы", "Автомобиль не найден.")
 
 # Базовый класс для диалогов
 class BaseDialog(QDialog):
-    def __init__(self, title, icon="car_icon.png", size=(700, 500)):
+    def __init__(self, title, icon=ICON_FILE, size=(700, 500)):
         super().__init__()
         self.setWindowTitle(title)
         self.setWindowIcon(QIcon(icon))
@@ -260,16 +476,14 @@ class AddCarDialog(BaseDialog):
 
         self.status_combo = QComboBox()
         StyleHelper.apply_widget_style(self.status_combo)
-        for status in session.query(Status).all():
-            self.status_combo.addItem(status.status, status.status_id)
+        fill_combo(self.status_combo, "status")
         self.left_layout.addWidget(QLabel("Статус:"))
         self.left_layout.addWidget(self.status_combo)
 
         self.driver_combo = QComboBox()
         StyleHelper.apply_widget_style(self.driver_combo)
         self.driver_combo.addItem("Без водителя", None)
-        for driver in session.query(Driver).all():
-            self.driver_combo.addItem(f"{driver.surname} {driver.name}", driver.driver_id)
+        fill_combo(self.driver_combo, "driver")
         self.left_layout.addWidget(QLabel("Водитель:"))
         self.left_layout.addWidget(self.driver_combo)
 
@@ -295,26 +509,26 @@ class AddCarDialog(BaseDialog):
         if not all(input_field.text() for input_field in self.inputs.values()):
             show_message("Ошибка", "Заполните все поля!", "warning")
             return
-        new_car = Car(
-            mark=self.inputs["mark"].text(),
-            model=self.inputs["model"].text(),
-            number=self.inputs["number"].text(),
-            mileage=int(self.inputs["mileage"].text()),
-            year=int(self.inputs["year"].text()),
-            status_id=self.status_combo.currentData(),
-            driver_id=self.driver_combo.currentData(),
-            photo=self.photo_data if hasattr(self, "photo_data") else None,
-            is_archived=False
-        )
-        session.add(new_car)
-        session.commit()
+        fields = car_fields(self.inputs, self.status_combo, self.driver_combo)
+        fields.update(photo_fields(self.photo_data if hasattr(self, "photo_data") else None))
+        self.save_btn.setEnabled(False)
+        run_in_background(write_car, None, fields, on_done=self.saved, on_error=self.save_failed)
+
+    def saved(self, car_id):
         show_message("Успех", "Автомобиль успешно добавлен!")
         self.accept()
 
+    def save_failed(self, text):
+        self.save_btn.setEnabled(True)
+        show_error(text)
+
 # Диалог редактирования автомобиля
 class EditCarDialog(BaseDialog):
+    @query_budget("open EditCarDialog", 4)
     def __init__(self, car):
         self.car = car
+        self.car_id = car.car_id
+        self.archived = False
         super().__init__("Редактирование автомобиля", size=(700, 500))
         self.setup_ui()
 
@@ -345,8 +559,7 @@ class EditCarDialog(BaseDialog):
 
         self.status_combo = QComboBox()
         StyleHelper.apply_widget_style(self.status_combo)
-        for status in session.query(Status).all():
-            self.status_combo.addItem(status.status, status.status_id)
+        fill_combo(self.status_combo, "status")
         self.status_combo.setCurrentIndex(self.status_combo.findData(self.car.status_id))
         self.left_layout.addWidget(QLabel("Статус:"))
         self.left_layout.addWidget(self.status_combo)
@@ -354,8 +567,7 @@ class EditCarDialog(BaseDialog):
         self.driver_combo = QComboBox()
         StyleHelper.apply_widget_style(self.driver_combo)
         self.driver_combo.addItem("Без водителя", None)
-        for driver in session.query(Driver).all():
-            self.driver_combo.addItem(f"{driver.surname} {driver.name}", driver.driver_id)
+        fill_combo(self.driver_combo, "driver")
         self.driver_combo.setCurrentIndex(self.driver_combo.findData(self.car.driver_id))
         self.left_layout.addWidget(QLabel("Водитель:"))
         self.left_layout.addWidget(self.driver_combo)
@@ -377,7 +589,7 @@ class EditCarDialog(BaseDialog):
         self.btn_layout.addWidget(self.delete_btn)
         self.left_layout.addLayout(self.btn_layout)
 
-        load_photo(self.car.photo, self.photo_label)
+        load_entity_photo(self.car, self.photo_label)
 
     def select_photo(self):
         self.photo_data = select_photo(self, self.photo_label)
@@ -386,27 +598,39 @@ class EditCarDialog(BaseDialog):
         if not all(input_field.text() for input_field in self.inputs.values()):
             show_message("Ошибка", "Заполните все поля!", "warning")
             return
-        self.car.mark = self.inputs["mark"].text()
-        self.car.model = self.inputs["model"].text()
-        self.car.number = self.inputs["number"].text()
-        self.car.mileage = int(self.inputs["mileage"].text())
-        self.car.year = int(self.inputs["year"].text())
-        self.car.status_id = self.status_combo.currentData()
-        self.car.driver_id = self.driver_combo.currentData()
+        fields = car_fields(self.inputs, self.status_combo, self.driver_combo)
         if hasattr(self, "photo_data"):
-            self.car.photo = self.photo_data
-        session.commit()
+            fields.update(photo_fields(self.photo_data))
+        self.set_buttons_enabled(False)
+        run_in_background(write_car, self.car_id, fields, on_done=self.saved, on_error=self.save_failed)
+
+    def saved(self, car_id):
+        # Автомобиль сохранен в другой сессии - данные в сессии GUI устарели
+        expire_cached(Car, car_id)
         show_message("Успех", "Изменения успешно сохранены!")
         self.accept()
 
     def archive_car(self):
         if show_message("Подтверждение", f"Действительно ли удалить автомобиль {self.car.mark} {self.car.model}?", "question"):
-            self.car.is_archived = True
-            session.commit()
-            self.accept()
+            self.set_buttons_enabled(False)
+            run_in_background(archive_car, self.car_id, on_done=self.archived_done, on_error=self.save_failed)
+
+    def archived_done(self, car_id):
+        expire_cached(Car, car_id)
+        self.archived = True
+        self.accept()
+
+    def set_buttons_enabled(self, enabled):
+        self.save_btn.setEnabled(enabled)
+        self.delete_btn.setEnabled(enabled)
+
+    def save_failed(self, text):
+        self.set_buttons_enabled(True)
+        show_error(text)
 
 # Диалог информации о водителе
 class DriverDetailsDialog(BaseDialog):
+    @query_budget("open DriverDetailsDialog", 3)
     def __init__(self, driver, parent=None):
         self.driver = driver
         self.parent_widget = parent
@@ -482,7 +706,7 @@ class DriverDetailsDialog(BaseDialog):
         self.btn_layout.addWidget(self.delete_btn)
         self.left_layout.addLayout(self.btn_layout)
         self.left_layout.addStretch()
-        load_photo(self.driver.photo, self.photo_label)
+        load_entity_photo(self.driver, self.photo_label)
 
     def update_ui(self):
         self.driver = session.query(Driver).get(self.driver.driver_id)
@@ -502,7 +726,7 @@ class DriverDetailsDialog(BaseDialog):
         self.address_inputs["home"].setText(str(address.home) if address.home is not None else "")
         self.address_inputs["index"].setText(str(address.index) if address.index is not None else "")
         
-        load_photo(self.driver.photo, self.photo_label)
+        load_entity_photo(self.driver, self.photo_label)
 
     def add_driver(self):
         dialog = AddDriverDialog()
@@ -518,10 +742,17 @@ class DriverDetailsDialog(BaseDialog):
 
     def delete_driver(self):
         if show_message("Подтверждение", f"Действительно ли удалить водителя {self.driver.surname} {self.driver.name}?", "question"):
-            session.delete(self.driver)
-            session.commit()
-            show_message("Успех", "Водитель успешно удален!")
-            self.accept()
+            self.delete_btn.setEnabled(False)
+            run_in_background(remove_driver, self.driver.driver_id, on_done=self.driver_deleted, on_error=self.delete_failed)
+
+    def driver_deleted(self, driver_id):
+        expire_cached(Driver, driver_id)
+        show_message("Успех", "Водитель успешно удален!")
+        self.accept()
+
+    def delete_failed(self, text):
+        self.delete_btn.setEnabled(True)
+        show_error(text)
 
 # Диалог добавления водителя
 class AddDriverDialog(BaseDialog):
@@ -615,34 +846,17 @@ class AddDriverDialog(BaseDialog):
         if not self.inputs["phone"].text().isdigit():
             show_message("Ошибка", "Телефон должен содержать только цифры!", "warning")
             return
-        address_fields = {key: self.address_inputs[key].text() for key in self.address_inputs}
-        if any(address_fields.values()):
-            address = Address(
-                region=address_fields["region"] or None,
-                city=address_fields["city"] or None,
-                street=address_fields["street"] or None,
-                home=int(address_fields["home"]) if address_fields["home"] else None,
-                index=int(address_fields["index"]) if address_fields["index"] else None
-            )
-            session.add(address)
-            session.flush()
-            address_id = address.address_id
-        else:
-            address_id = None
-        driver = Driver(
-            surname=self.inputs["surname"].text(),
-            name=self.inputs["name"].text(),
-            middle_name=self.inputs["middle_name"].text() or None,
-            phone=self.inputs["phone"].text(),
-            experience=int(self.inputs["experience"].text()) if self.inputs["experience"].text() else None,
-            drivers_license_series=self.inputs["series"].text(),
-            drivers_license_numbers=self.inputs["number"].text(),
-            address_id=address_id,
-            photo=self.photo_data if hasattr(self, "photo_data") else None
-        )
-        session.add(driver)
-        session.commit()
-        self.accept()
+        fields = driver_fields(self.inputs)
+        fields.update(photo_fields(self.photo_data if hasattr(self, "photo_data") else None))
+        self.save_btn.setEnabled(False)
+        self.save_btn.setText("Сохранение...")
+        run_in_background(write_driver, None, fields, address_fields(self.address_inputs),
+                          on_done=lambda _: self.accept(), on_error=self.save_failed)
+
+    def save_failed(self, text):
+        self.save_btn.setEnabled(True)
+        self.save_btn.setText("Сохранить")
+        show_error(text)
 
 # Диалог редактирования водителя
 class EditDriverDialog(BaseDialog):
@@ -716,7 +930,7 @@ class EditDriverDialog(BaseDialog):
         self.btn_layout.addWidget(self.save_btn)
         self.left_layout.addLayout(self.btn_layout)
         self.left_layout.addStretch()
-        load_photo(self.driver.photo, self.photo_label)
+        load_entity_photo(self.driver, self.photo_label)
 
     def select_photo(self):
         self.photo_data = select_photo(self, self.photo_label)
@@ -738,41 +952,34 @@ class EditDriverDialog(BaseDialog):
         if not self.inputs["phone"].text().isdigit():
             show_message("Ошибка", "Телефон должен содержать только цифры!", "warning")
             return
-        address_fields = {key: self.address_inputs[key].text() for key in self.address_inputs}
-        if any(address_fields.values()):
-            if not self.driver.address_id:
-                address = Address()
-                session.add(address)
-                session.flush()
-                self.driver.address_id = address.address_id
-            else:
-                address = session.query(Address).get(self.driver.address_id)
-            address.region = address_fields["region"] or None
-            address.city = address_fields["city"] or None
-            address.street = address_fields["street"] or None
-            address.home = int(address_fields["home"]) if address_fields["home"] else None
-            address.index = int(address_fields["index"]) if address_fields["index"] else None
-        else:
-            self.driver.address_id = None
-        self.driver.surname = self.inputs["surname"].text()
-        self.driver.name = self.inputs["name"].text()
-        self.driver.middle_name = self.inputs["middle_name"].text() or None
-        self.driver.phone = self.inputs["phone"].text()
-        self.driver.experience = int(self.inputs["experience"].text()) if self.inputs["experience"].text() else None
-        self.driver.drivers_license_series = self.inputs["series"].text()
-        self.driver.drivers_license_numbers = self.inputs["number"].text()
+        fields = driver_fields(self.inputs)
         if hasattr(self, "photo_data"):
-            self.driver.photo = self.photo_data
-        session.commit()
+            fields.update(photo_fields(self.photo_data))
+        self.save_btn.setEnabled(False)
+        self.save_btn.setText("Сохранение...")
+        run_in_background(write_driver, self.driver.driver_id, fields, address_fields(self.address_inputs),
+                          on_done=self.saved, on_error=self.save_failed)
+
+    def saved(self, driver_id):
+        # Водитель сохранен в другой сессии - данные в сессии GUI устарели
+        expire_cached(Driver, driver_id)
+        if self.driver.address_id:
+            expire_cached(Address, self.driver.address_id)
         self.accept()
 
+    def save_failed(self, text):
+        self.save_btn.setEnabled(True)
+        self.save_btn.setText("Сохранить")
+        show_error(text)
+
 # Диалог ТО и расходов
 class CarServiceExpensesDialog(QDialog):
-    def __init__(self, car):
-        super().__init__()
+    @query_budget("open CarServiceExpensesDialog", 0)
+    def __init__(self, car, parent=None):
+        super().__init__(parent)
         self.car = car
         self.setWindowTitle(f"ТО и Расходы: {car.mark} {car.model}")
-        self.setWindowIcon(QIcon("car_icon.png"))
+        self.setWindowIcon(QIcon(ICON_FILE))
         self.setMinimumSize(700, 600)
 
         self.main_layout = QVBoxLayout()
@@ -786,10 +993,12 @@ class CarServiceExpensesDialog(QDialog):
         StyleHelper.apply_widget_style(self.service_label)
         self.content_layout.addWidget(self.service_label)
         
-        self.service_table = QTableWidget()
-        self.service_table.setColumnCount(5)
-        self.service_table.setHorizontalHeaderLabels(["Дата ТО", "Тип работ", "Следующее ТО", "Пробег на момент ТО", "Заключение"])
-        StyleHelper.apply_widget_style(self.service_table)
+        self.service_model = PagedTableModel(
+            [("Дата ТО", format_date), ("Тип работ", format_text), ("Следующее ТО", format_date),
+             ("Пробег на момент ТО", format_text), ("Заключение", format_text)],
+            partial(fetch_services, car.car_id), parent=self)
+        self.service_model.on_first_page = self.show_services
+        self.service_table = self.create_table(self.service_model)
         self.load_services()
         self.content_layout.addWidget(self.service_table)
 
@@ -809,10 +1018,11 @@ class CarServiceExpensesDialog(QDialog):
         StyleHelper.apply_widget_style(self.expenses_label)
         self.content_layout.addWidget(self.expenses_label)
         
-        self.expenses_table = QTableWidget()
-        self.expenses_table.setColumnCount(3)
-        self.expenses_table.setHorizontalHeaderLabels(["Тип расхода", "Сумма", "Дата"])
-        StyleHelper.apply_widget_style(self.expenses_table)
+        self.expenses_model = PagedTableModel(
+            [("Тип расхода", format_text), ("Сумма", format_sum), ("Дата", format_date)],
+            partial(fetch_expenses, car.car_id), parent=self)
+        self.expenses_model.on_first_page = self.show_expenses
+        self.expenses_table = self.create_table(self.expenses_model)
         self.load_expenses()
         self.content_layout.addWidget(self.expenses_table)
 
@@ -832,16 +1042,37 @@ class CarServiceExpensesDialog(QDialog):
         self.car_report_btn = QPushButton("Отчёт по автомобилю")
         self.expenses_report_btn = QPushButton("Отчёт по расходам")
         self.service_schedule_btn = QPushButton("График ТО")
-        for btn in [self.car_report_btn, self.expenses_report_btn, self.service_schedule_btn]:
+        self.export_btn = QPushButton("Выгрузка")
+        for btn in [self.car_report_btn, self.expenses_report_btn, self.service_schedule_btn, self.export_btn]:
             StyleHelper.apply_button_style(btn)
         self.car_report_btn.clicked.connect(self.generate_car_report)
         self.expenses_report_btn.clicked.connect(self.generate_expenses_report)
         self.service_schedule_btn.clicked.connect(self.generate_service_schedule)
+        self.export_btn.clicked.connect(lambda: ExportDialog(self, self.car).exec())
         self.report_btn_layout.addWidget(self.car_report_btn)
         self.report_btn_layout.addWidget(self.expenses_report_btn)
         self.report_btn_layout.addWidget(self.service_schedule_btn)
+        self.report_btn_layout.addWidget(self.export_btn)
         self.content_layout.addLayout(self.report_btn_layout)
 
+        # Отчеты формируются в фоне по очереди, одна задача за другой
+        self.report_queue = []
+        self.report_cancel = None
+        self.report_status_layout = QHBoxLayout()
+        self.report_status = QLabel("")
+        StyleHelper.apply_widget_style(self.report_status)
+        self.report_progress = QProgressBar()
+        self.report_progress.setRange(0, 0)
+        self.report_cancel_btn = QPushButton("Отменить отчёты")
+        StyleHelper.apply_button_style(self.report_cancel_btn)
+        self.report_cancel_btn.clicked.connect(self.cancel_reports)
+        self.report_status_layout.addWidget(self.report_status, 1)
+        self.report_status_layout.addWidget(self.report_progress)
+        self.report_status_layout.addWidget(self.report_cancel_btn)
+        self.report_progress.hide()
+        self.report_cancel_btn.hide()
+        self.content_layout.addLayout(self.report_status_layout)
+
         self.close_btn = QPushButton("Закрыть")
         StyleHelper.apply_button_style(self.close_btn)
         self.close_btn.clicked.connect(self.accept)
@@ -849,229 +1080,152 @@ class CarServiceExpensesDialog(QDialog):
         self.main_layout.addLayout(self.content_layout)
         self.setLayout(self.main_layout)
 
-        try:
-            pdfmetrics.registerFont(TTFont('DejaVuSans', 'DejaVuSans.ttf'))
-        except Exception as e:
-            show_message("Ошибка", f"Не удалось загрузить шрифт DejaVuSans: {str(e)}", "warning")
-
+    def create_table(self, model):
+        table = QTableView()
+        table.setModel(model)
+        table.setSelectionBehavior(QTableView.SelectRows)
+        table.setSelectionMode(QTableView.SingleSelection)
+        # Ширина колонок считается по первой странице, а не по всей истории
+        table.horizontalHeader().setResizeContentsPrecision(model.page_size)
+        StyleHelper.apply_widget_style(table)
+        return table
+
+    # Списки подгружаются в фоне постранично по мере прокрутки
     def load_services(self):
-        services = session.query(ServiceCar).filter_by(car_id=self.car.car_id).all()
-        self.service_table.setRowCount(len(services))
-        for row, service in enumerate(services):
-            self.service_table.setItem(row, 0, QTableWidgetItem(service.date_service.strftime('%Y-%m-%d') if service.date_service else ""))
-            self.service_table.setItem(row, 1, QTableWidgetItem(service.type_work.type if service.type_work else ""))
-            self.service_table.setItem(row, 2, QTableWidgetItem(service.next_date.strftime('%Y-%m-%d') if service.next_date else ""))
-            self.service_table.setItem(row, 3, QTableWidgetItem(str(service.mileage_at_service) if service.mileage_at_service is not None else ""))
-            self.service_table.setItem(row, 4, QTableWidgetItem(service.conclusion or ""))
+        self.service_label.setText("Техническое обслуживание: загрузка...")
+        self.service_model.reload()
+
+    def show_services(self):
+        self.service_label.setText("Техническое обслуживание:")
         self.service_table.resizeColumnsToContents()
 
     def load_expenses(self):
-        expenses = session.query(ExpensesCar).filter_by(car_id=self.car.car_id).all()
-        self.expenses_table.setRowCount(len(expenses))
-        for row, expense in enumerate(expenses):
-            self.expenses_table.setItem(row, 0, QTableWidgetItem(expense.type_expenses.type_expenses if expense.type_expenses else ""))
-            self.expenses_table.setItem(row, 1, QTableWidgetItem(str(expense.sum) if expense.sum is not None else "0.0"))
-            self.expenses_table.setItem(row, 2, QTableWidgetItem(expense.date_expenses.strftime('%Y-%m-%d') if expense.date_expenses else ""))
-        self.expenses_table.resizeColumnsToContents()
+        self.expenses_label.setText("Расходы: загрузка...")
+        self.expenses_model.reload()
 
-    # Обновление пробега автомобиля относительно крайней записи в ТО
-    def update_car_mileage(self):
-        latest_service = session.query(ServiceCar).filter_by(car_id=self.car.car_id)\
-            .order_by(ServiceCar.date_service.desc()).first()
-        if latest_service and latest_service.mileage_at_service is not None:
-            self.car.mileage = latest_service.mileage_at_service
-            session.commit()
+    def show_expenses(self):
+        self.expenses_label.setText("Расходы:")
+        self.expenses_table.resizeColumnsToContents()
 
+    # Записи ТО и расходов читаются и сохраняются в фоне; пробег автомобиля по последнему ТО
+    # пересчитывается в той же транзакции, что и запись ТО
     def add_service(self):
         dialog = AddServiceCarDialog(self.car)
         if dialog.exec():
-            new_service = dialog.get_service_data()
-            if new_service:
-                session.add(new_service)
-                session.commit()
-                self.load_services()
-                self.update_car_mileage()
-                if hasattr(self.parent(), 'card'):
-                    self.parent().card.update_card()
+            fields = dialog.get_service_data()
+            if fields:
+                run_in_background(write_service, self.car.car_id, None, fields, on_done=self.service_saved)
 
     def edit_service(self):
-        selected_row = self.service_table.currentRow()
-        if selected_row >= 0:
-            services = session.query(ServiceCar).filter_by(car_id=self.car.car_id).all()
-            if selected_row < len(services):
-                dialog = EditServiceCarDialog(services[selected_row])
-                if dialog.exec():
-                    if dialog.is_deleted:
-                        session.delete(services[selected_row])
-                    session.commit()
-                    self.load_services()
-                    self.update_car_mileage()
-                    if hasattr(self.parent(), 'card'):
-                        self.parent().card.update_card()
+        service_id = self.service_model.row_id(self.service_table.currentIndex().row())
+        if service_id is not None:
+            run_in_background(fetch_service, service_id, on_done=self.open_service)
+
+    def open_service(self, service):
+        if service:
+            dialog = EditServiceCarDialog(service)
+            if dialog.exec():
+                fields = None if dialog.is_deleted else dialog.get_service_data()
+                run_in_background(write_service, self.car.car_id, service.service_car_id, fields,
+                                  on_done=self.service_saved)
+
+    # Пробег записан в фоновой сессии: автомобиль в сессии GUI-потока устаревает, карточка
+    # главного окна перечитывает его
+    def service_saved(self, mileage):
+        self.load_services()
+        if hasattr(self.parent(), 'card'):
+            self.parent().card.update_card()
+        expire_cached(Car, self.car.car_id)
 
     def add_expenses(self):
         dialog = AddExpensesCarDialog(self.car)
         if dialog.exec():
-            new_expense = dialog.get_expense_data()
-            if new_expense:
-                session.add(new_expense)
-                session.commit()
-                self.load_expenses()
+            fields = dialog.get_expense_data()
+            if fields:
+                run_in_background(write_expense, self.car.car_id, None, fields, on_done=lambda _: self.load_expenses())
 
     def edit_expenses(self):
-        selected_row = self.expenses_table.currentRow()
-        if selected_row >= 0:
-            expenses = session.query(ExpensesCar).filter_by(car_id=self.car.car_id).all()
-            if selected_row < len(expenses):
-                dialog = EditExpensesCarDialog(expenses[selected_row])
-                if dialog.exec():
-                    if dialog.is_deleted:
-                        session.delete(expenses[selected_row])
-                    session.commit()
-                    self.load_expenses()
+        expense_id = self.expenses_model.row_id(self.expenses_table.currentIndex().row())
+        if expense_id is not None:
+            run_in_background(fetch_expense, expense_id, on_done=self.open_expense)
+
+    def open_expense(self, expense):
+        if expense:
+            dialog = EditExpensesCarDialog(expense)
+            if dialog.exec():
+                fields = None if dialog.is_deleted else dialog.get_expense_data()
+                run_in_background(write_expense, self.car.car_id, expense.expenses_car_id, fields,
+                                  on_done=lambda _: self.load_expenses())
                     
-    # Отчет об автомобиле
-    def generate_car_report(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить отчёт по автомобилю", f"Отчёт_{self.car.mark}_{self.car.model}.pdf", "PDF Files (*.pdf)")
+    # Отчет ставится в очередь; окно остается доступным, пока отчеты формируются
+    def save_report(self, kind, caption, done_text, file_path=None):
+        if not file_path:
+            from reports import report_file_name
+            file_path, _ = QFileDialog.getSaveFileName(self, caption, report_file_name(kind, self.car.mark, self.car.model), "PDF Files (*.pdf)")
         if not file_path:
             return
+        self.report_queue.append((kind, file_path, done_text))
+        if self.report_cancel is None:
+            self.next_report()
+        else:
+            self.show_report_progress(0)
+
+    def next_report(self):
+        if not self.report_queue:
+            self.report_cancel = None
+            self.report_progress.hide()
+            self.report_cancel_btn.hide()
+            return
+        from reports import build_report
+        kind, file_path, done_text = self.report_queue.pop(0)
+        self.report_cancel = threading.Event()
+        self.report_done_text = done_text
+        self.report_progress.show()
+        self.report_cancel_btn.show()
+        self.show_report_progress(0)
+        run_in_background(build_report, kind, self.car.car_id, file_path, cancelled=self.report_cancel.is_set,
+                          on_progress=self.show_report_progress, on_done=self.report_done, on_error=self.report_failed)
+
+    def show_report_progress(self, page):
+        text = f"{self.report_done_text} формируется, страниц: {page}" if page else f"{self.report_done_text} формируется..."
+        if self.report_queue:
+            text += f"; в очереди: {len(self.report_queue)}"
+        self.report_status.setText(text)
+
+    def report_done(self, file_path):
+        self.report_status.setText(f"{self.report_done_text} сохранён по пути: {file_path}")
+        self.next_report()
+
+    def report_failed(self, text):
+        if self.report_cancel.is_set():
+            self.report_status.setText(text)
+            self.next_report()
+            return
+        self.report_status.setText("")
+        self.next_report()
+        show_message("Ошибка", f"Не удалось сформировать отчёт: {text}", "warning")
 
-        doc = SimpleDocTemplate(file_path, pagesize=A4)
-        styles = getSampleStyleSheet()
-        title_style = styles["Title"]
-        title_style.fontName = "DejaVuSans"
-        normal_style = styles["Normal"]
-        normal_style.fontName = "DejaVuSans"
-        normal_style.fontSize = 12
-        elements = []
-
-        elements.append(Paragraph(f"Отчёт по автомобилю: {self.car.mark} {self.car.model}", title_style))
-        elements.append(Spacer(1, 12))
-
-        driver = self.car.driver
-        data = [
-            f"Марка: {self.car.mark}",
-            f"Модель: {self.car.model}",
-            f"Номер: {self.car.number}",
-            f"Пробег: {self.car.mileage} км",
-            f"Год: {self.car.year}",
-            f"Статус: {self.car.status.status}",
-            f"Водитель: {driver.surname} {driver.name} {driver.middle_name or ''}" if driver else "Водитель: Не назначен",
-        ]
-        for line in data:
-            elements.append(Paragraph(line, normal_style))
-            elements.append(Spacer(1, 6))
-
-        doc.build(elements)
-        show_message("Успех", f"Отчёт сохранён по пути: {file_path}")
+    # Отмена текущего отчета и всей очереди
+    def cancel_reports(self):
+        self.report_queue.clear()
+        if self.report_cancel is not None:
+            self.report_cancel.set()
+
+    def done(self, result):
+        self.cancel_reports()
+        super().done(result)
+
+    # Отчет об автомобиле
+    def generate_car_report(self):
+        self.save_report("car", "Сохранить отчёт по автомобилю", "Отчёт")
 
     # Отчет по затратам на автомобиль
     def generate_expenses_report(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить отчёт по расходам", f"Расходы_{self.car.mark}_{self.car.model}.pdf", "PDF Files (*.pdf)")
-        if not file_path:
-            return
-
-        doc = SimpleDocTemplate(file_path, pagesize=A4)
-        styles = getSampleStyleSheet()
-        title_style = styles["Title"]
-        title_style.fontName = "DejaVuSans"
-        normal_style = styles["Normal"]
-        normal_style.fontName = "DejaVuSans"
-        normal_style.fontSize = 10
-        elements = []
-
-        elements.append(Paragraph(f"Отчёт по расходам на автомобиль: {self.car.mark} {self.car.model}", title_style))
-        elements.append(Spacer(1, 12))
-
-        expenses = session.query(ExpensesCar).filter_by(car_id=self.car.car_id).all()
-        if not expenses:
-            elements.append(Paragraph("Расходы отсутствуют.", normal_style))
-        else:
-            data = [["Тип расхода", "Сумма", "Дата"]]
-            for expense in expenses:
-                data.append([
-                    expense.type_expenses.type_expenses if expense.type_expenses else "",
-                    str(expense.sum) if expense.sum is not None else "0.0",
-                    expense.date_expenses.strftime('%Y-%m-%d') if expense.date_expenses else ""
-                ])
-            table = Table(data, colWidths=[200, 100, 100])
-            table.setStyle(TableStyle([
-                ('FONT', (0, 0), (-1, -1), 'DejaVuSans'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ]))
-            elements.append(table)
-
-        doc.build(elements)
-        show_message("Успех", f"Отчёт сохранён по пути: {file_path}")
+        self.save_report("expenses", "Сохранить отчёт по расходам", "Отчёт")
 
     # График ТО
     def generate_service_schedule(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить график ТО", f"График_ТО_{self.car.mark}_{self.car.model}.pdf", "PDF Files (*.pdf)")
-        if not file_path:
-            return
-
-        doc = SimpleDocTemplate(file_path, pagesize=A4)
-        styles = getSampleStyleSheet()
-        title_style = styles["Title"]
-        title_style.fontName = "DejaVuSans"
-        normal_style = styles["Normal"]
-        normal_style.fontName = "DejaVuSans"
-        normal_style.fontSize = 10
-        elements = []
-
-        elements.append(Paragraph(f"График ТО для автомобиля: {self.car.mark} {self.car.model}", title_style))
-        elements.append(Spacer(1, 12))
-
-        services = session.query(ServiceCar).filter_by(car_id=self.car.car_id).order_by(ServiceCar.date_service).all()
-        if not services:
-            elements.append(Paragraph("ТО отсутствуют.", normal_style))
-        else:
-            drawing = Drawing(500, 400)
-            x_base = 50
-            y_start = 350
-            y_end = 50
-            drawing.add(Line(x_base, y_start, x_base, y_end))
-
-            valid_services = [s for s in services if s.date_service is not None]
-            if not valid_services:
-                elements.append(Paragraph("Нет данных о датах ТО.", normal_style))
-            else:
-                earliest_date = min(s.date_service for s in valid_services).toordinal()
-                latest_date = max(s.next_date.toordinal() if s.next_date else s.date_service.toordinal() for s in valid_services)
-                date_range = latest_date - earliest_date if latest_date > earliest_date else 1
-
-                min_text_spacing = 25
-                last_y_position = y_start
-                service_dates = {s.date_service.strftime('%Y-%m-%d') for s in valid_services}
-
-                for service in valid_services:
-                    date_pos = y_start - ((service.date_service.toordinal() - earliest_date) / date_range) * (y_start - y_end)
-                    next_date_pos = y_start - ((service.next_date.toordinal() - earliest_date) / date_range) * (y_start - y_end) if service.next_date else None
-
-                    drawing.add(Line(x_base, date_pos, x_base + 20, date_pos))
-                    text_y = min(date_pos, last_y_position - min_text_spacing)
-                    if text_y < y_end:
-                        text_y = y_end
-                    label = f"{service.date_service.strftime('%Y-%m-%d')} ({service.type_work.type if service.type_work else 'Не указано'})"
-                    drawing.add(String(x_base + 25, text_y - 5, label, fontName="DejaVuSans", fontSize=8))
-                    drawing.add(String(x_base + 25, text_y - 15, f"Пробег: {service.mileage_at_service or 0}, {service.conclusion or ''}", fontName="DejaVuSans", fontSize=8))
-                    last_y_position = text_y - 15
-
-                    if service.next_date and service.next_date.strftime('%Y-%m-%d') not in service_dates:
-                        drawing.add(Line(x_base, next_date_pos, x_base + 10, next_date_pos, strokeDashArray=[4, 2]))
-                        next_text_y = min(next_date_pos, last_y_position - min_text_spacing)
-                        if next_text_y < y_end:
-                            next_text_y = y_end
-                        drawing.add(String(x_base + 15, next_text_y - 5, f"След. ТО: {service.next_date.strftime('%Y-%m-%d')}", fontName="DejaVuSans", fontSize=8))
-                        last_y_position = next_text_y - 5
-
-                elements.append(drawing)
-
-        doc.build(elements)
-        show_message("Успех", f"График сохранён по пути: {file_path}")
+        self.save_report("schedule", "Сохранить график ТО", "График")
 
 # Диалог добавления ТО
 class AddServiceCarDialog(QDialog):
@@ -1091,8 +1245,7 @@ class AddServiceCarDialog(QDialog):
         self.layout.addWidget(self.date_input)
 
         self.type_work_combo = QComboBox()
-        for type_work in session.query(TypeWork).all():
-            self.type_work_combo.addItem(type_work.type, type_work.type_work_id)
+        fill_combo(self.type_work_combo, "type_work")
         self.layout.addWidget(QLabel("Тип работ:"))
         self.layout.addWidget(self.type_work_combo)
 
@@ -1127,15 +1280,7 @@ class AddServiceCarDialog(QDialog):
         if not self.mileage_input.text():
             show_message("Ошибка", "Введите пробег на момент ТО!", "warning")
             return None
-        service = ServiceCar(
-            car_id=self.car.car_id,
-            mileage_at_service=int(self.mileage_input.text()),
-            type_work_id=self.type_work_combo.currentData(),
-            date_service=self.date_input.date().toPython(),
-            next_date=self.next_date_input.date().toPython(),
-            conclusion=self.conclusion_input.text() or None
-        )
-        return service
+        return service_fields(self)
 
 # Диалог редактирования ТО
 class EditServiceCarDialog(QDialog):
@@ -1156,8 +1301,7 @@ class EditServiceCarDialog(QDialog):
         self.layout.addWidget(self.date_input)
 
         self.type_work_combo = QComboBox()
-        for type_work in session.query(TypeWork).all():
-            self.type_work_combo.addItem(type_work.type, type_work.type_work_id)
+        fill_combo(self.type_work_combo, "type_work")
         self.type_work_combo.setCurrentIndex(self.type_work_combo.findData(self.service.type_work_id))
         self.layout.addWidget(QLabel("Тип работ:"))
         self.layout.addWidget(self.type_work_combo)
@@ -1197,14 +1341,11 @@ class EditServiceCarDialog(QDialog):
         if not self.mileage_input.text():
             show_message("Ошибка", "Введите пробег на момент ТО!", "warning")
             return
-        self.service.mileage_at_service = int(self.mileage_input.text())
-        self.service.type_work_id = self.type_work_combo.currentData()
-        self.service.date_service = self.date_input.date().toPython()
-        self.service.next_date = self.next_date_input.date().toPython()
-        self.service.conclusion = self.conclusion_input.text() or None
-        session.commit()
         self.accept()
 
+    def get_service_data(self):
+        return service_fields(self)
+
     def delete_service(self):
         self.is_deleted = True
         self.accept()
@@ -1221,8 +1362,7 @@ class AddExpensesCarDialog(QDialog):
     def setup_ui(self):
         self.layout = QVBoxLayout()
         self.type_expenses_combo = QComboBox()
-        for type_expense in session.query(TypeExpenses).all():
-            self.type_expenses_combo.addItem(type_expense.type_expenses, type_expense.type_expenses_id)
+        fill_combo(self.type_expenses_combo, "type_expenses")
         self.layout.addWidget(QLabel("Тип расхода:"))
         self.layout.addWidget(self.type_expenses_combo)
 
@@ -1253,13 +1393,7 @@ class AddExpensesCarDialog(QDialog):
         if not self.sum_input.text():
             show_message("Ошибка", "Введите сумму!", "warning")
             return None
-        expense = ExpensesCar(
-            car_id=self.car.car_id,
-            type_expenses_id=self.type_expenses_combo.currentData(),
-            sum=float(self.sum_input.text()),
-            date_expenses=self.date_input.date().toPython()
-        )
-        return expense
+        return expense_fields(self)
 
 # Диалог редактирования расходов
 class EditExpensesCarDialog(QDialog):
@@ -1274,8 +1408,7 @@ class EditExpensesCarDialog(QDialog):
     def setup_ui(self):
         self.layout = QVBoxLayout()
         self.type_expenses_combo = QComboBox()
-        for type_expense in session.query(TypeExpenses).all():
-            self.type_expenses_combo.addItem(type_expense.type_expenses, type_expense.type_expenses_id)
+        fill_combo(self.type_expenses_combo, "type_expenses")
         self.type_expenses_combo.setCurrentIndex(self.type_expenses_combo.findData(self.expense.type_expenses_id))
         self.layout.addWidget(QLabel("Тип расхода:"))
         self.layout.addWidget(self.type_expenses_combo)
@@ -1312,13 +1445,14 @@ class EditExpensesCarDialog(QDialog):
             show_message("Ошибка", "Введите сумму!", "warning")
             return
         try:
-            self.expense.type_expenses_id = self.type_expenses_combo.currentData()
-            self.expense.sum = float(self.sum_input.text())
-            self.expense.date_expenses = self.date_input.date().toPython()
-            session.commit()
-            self.accept()
+            self.fields = expense_fields(self)
         except ValueError:
             show_message("Ошибка", "Сумма должна быть числом!", "warning")
+            return
+        self.accept()
+
+    def get_expense_data(self):
+        return self.fields
 
     def delete_expense(self):
         self.is_deleted = True
@@ -1326,11 +1460,12 @@ class EditExpensesCarDialog(QDialog):
 
 # Диалог архива автомобилей
 class ArchiveDialog(QDialog):
+    @query_budget("open ArchiveDialog", 0)
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
         self.setWindowTitle("Архив автомобилей")
-        self.setWindowIcon(QIcon("car_icon.png"))
+        self.setWindowIcon(QIcon(ICON_FILE))
         self.setMinimumSize(400, 400)
         self.setup_ui()
 
@@ -1350,11 +1485,17 @@ class ArchiveDialog(QDialog):
         self.search_layout.addWidget(self.search_input)
         self.search_layout.addWidget(self.search_btn)
         self.main_layout.addLayout(self.search_layout)
+        self.search = CarSearch(session, archived=True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.filter_archive)
+        self.search_input.textEdited.connect(self.search_timer.start)
 
         self.archive_list = QListWidget()
         StyleHelper.apply_widget_style(self.archive_list, "border: 1px solid #ffd700; border-radius: 5px;")
-        self.archived_cars = session.query(Car).filter_by(is_archived=True).all()
-        self.load_archive_list(self.archived_cars)
+        self.archived_cars = []
+        self.load_archive()
         self.archive_list.itemDoubleClicked.connect(self.show_car_details)
         self.main_layout.addWidget(self.archive_list)
 
@@ -1370,6 +1511,15 @@ class ArchiveDialog(QDialog):
         self.main_layout.addLayout(self.btn_layout)
         self.setLayout(self.main_layout)
 
+    def load_archive(self):
+        self.archive_list.clear()
+        self.archive_list.addItem("Загрузка...")
+        run_in_background(fetch_archived_cars, on_done=self.show_archive)
+
+    def show_archive(self, cars):
+        self.archived_cars = cars
+        self.filter_archive()
+
     def load_archive_list(self, cars):
         self.archive_list.clear()
         for car in cars:
@@ -1387,26 +1537,249 @@ class ArchiveDialog(QDialog):
         current_item = self.archive_list.currentItem()
         if current_item:
             car_id = current_item.data(Qt.UserRole)
-            car = session.query(Car).get(car_id)
-            car.is_archived = False
-            session.commit()
-            self.archived_cars = session.query(Car).filter_by(is_archived=True).all()
+            if car_id is None:
+                return
+            self.restore_btn.setEnabled(False)
+            run_in_background(unarchive_car, car_id, on_done=self.car_restored, on_error=self.restore_failed)
+
+    def car_restored(self, car_id):
+        self.restore_btn.setEnabled(True)
+        expire_cached(Car, car_id)
+        self.search.invalidate()
+        self.parent.search.invalidate()
+        self.load_archive()
+        self.parent.reload_cars()
+
+    def restore_failed(self, text):
+        self.restore_btn.setEnabled(True)
+        show_error(text)
+
+    def filter_archive(self):
+        query = self.search_input.text().strip()
+        if not query:
             self.load_archive_list(self.archived_cars)
-            self.parent.cars = session.query(Car).filter_by(is_archived=False).all()
-            self.parent.load_current_car()
+            return []
+        hits = self.search.search(query, limit=200)
+        self.archive_list.clear()
+        for hit in hits:
+            item = QListWidgetItem(f"{hit.title} ({hit.number})")
+            item.setData(Qt.UserRole, hit.car_id)
+            self.archive_list.addItem(item)
+        return hits
 
     def search_in_archive(self):
-        query = self.search_input.text().strip().lower()
-        if not query:
-            self.load_archive_list(self.archived_cars)
-            return
-        filtered_cars = [car for car in self.archived_cars if query in car.number.lower() or query in f"{car.mark} {car.model}".lower()]
-        self.load_archive_list(filtered_cars)
-        if not filtered_cars:
+        self.search_timer.stop()
+        hits = self.filter_archive()
+        if self.search_input.text().strip() and not hits:
             show_message("Результат", "Автомобиль не найден в архиве.")
 
+# Выгрузка ТО или расходов в CSV/XLSX по автомобилю или по всему автопарку; идет в фоне
+class ExportDialog(QDialog):
+    def __init__(self, parent, car=None):
+        super().__init__(parent)
+        self.car = car
+        self.cancel_event = threading.Event()
+        self.setWindowTitle("Выгрузка данных")
+        self.setWindowIcon(QIcon(ICON_FILE))
+        self.setMinimumSize(400, 250)
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.main_layout = QVBoxLayout()
+        title = f"Выгрузка: {self.car.mark} {self.car.model}" if self.car else "Выгрузка по автопарку"
+        self.header_label = QPushButton(title)
+        StyleHelper.apply_title_style(self.header_label)
+        self.main_layout.addWidget(self.header_label, alignment=Qt.AlignCenter)
+
+        self.kind_combo = QComboBox()
+        self.kind_combo.addItem("Техническое обслуживание", "services")
+        self.kind_combo.addItem("Расходы", "expenses")
+        self.format_combo = QComboBox()
+        self.format_combo.addItem("CSV", "csv")
+        self.format_combo.addItem("Excel (XLSX)", "xlsx")
+        for combo in [self.kind_combo, self.format_combo]:
+            StyleHelper.apply_widget_style(combo)
+            self.main_layout.addWidget(combo)
+
+        self.status_label = QLabel("")
+        StyleHelper.apply_widget_style(self.status_label)
+        self.main_layout.addWidget(self.status_label)
+
+        self.btn_layout = QHBoxLayout()
+        self.start_btn = QPushButton("Выгрузить")
+        self.cancel_btn = QPushButton("Отмена")
+        self.close_btn = QPushButton("Закрыть")
+        for btn in [self.start_btn, self.cancel_btn, self.close_btn]:
+            StyleHelper.apply_button_style(btn)
+            self.btn_layout.addWidget(btn)
+        self.cancel_btn.setEnabled(False)
+        self.start_btn.clicked.connect(self.start)
+        self.cancel_btn.clicked.connect(self.cancel_event.set)
+        self.close_btn.clicked.connect(self.reject)
+        self.main_layout.addLayout(self.btn_layout)
+        self.setLayout(self.main_layout)
+
+    def start(self, file_path=None):
+        kind = self.kind_combo.currentData()
+        extension = self.format_combo.currentData()
+        if not file_path:
+            name = f"{kind}_{self.car.number if self.car else 'автопарк'}.{extension}"
+            file_path, _ = QFileDialog.getSaveFileName(self, "Сохранить выгрузку", name, f"{extension.upper()} (*.{extension})")
+        if not file_path:
+            return
+        from export import export_file
+        self.cancel_event.clear()
+        self.start_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_label.setText("Выгрузка...")
+        run_in_background(export_file, kind, file_path, self.car.car_id if self.car else None,
+                          cancelled=self.cancel_event.is_set,
+                          on_progress=self.show_progress, on_done=self.export_done, on_error=self.export_failed)
+
+    def show_progress(self, count):
+        self.status_label.setText(f"Выгружено строк: {count}")
+
+    def export_done(self, count):
+        self.start_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText(f"Готово, выгружено строк: {count}")
+
+    def export_failed(self, text):
+        self.start_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        if self.cancel_event.is_set():
+            self.status_label.setText(text)
+        else:
+            self.status_label.setText("")
+            show_error(text)
+
+    def reject(self):
+        self.cancel_event.set()
+        super().reject()
+
+# Пакетная генерация отчетов по выбранным автомобилям в пуле процессов
+class BatchReportDialog(QDialog):
+    @query_budget("open BatchReportDialog", 0)
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.batch = None
+        self.setWindowTitle("Отчёты по автопарку")
+        self.setWindowIcon(QIcon(ICON_FILE))
+        self.setMinimumSize(450, 500)
+        self.setup_ui()
+
+    def setup_ui(self):
+        self.main_layout = QVBoxLayout()
+        self.header_label = QPushButton("Отчёты по автопарку")
+        StyleHelper.apply_title_style(self.header_label)
+        self.main_layout.addWidget(self.header_label, alignment=Qt.AlignCenter)
+
+        self.all_check = QCheckBox("Выбрать все")
+        self.all_check.setChecked(True)
+        self.all_check.toggled.connect(self.check_all)
+        self.main_layout.addWidget(self.all_check)
+        self.car_list = QListWidget()
+        StyleHelper.apply_widget_style(self.car_list, "border: 1px solid #ffd700; border-radius: 5px;")
+        self.car_list.addItem("Загрузка...")
+        self.main_layout.addWidget(self.car_list)
+        run_in_background(fetch_active_cars, on_done=self.show_cars)
+
+        self.kind_checks = {}
+        self.kind_layout = QHBoxLayout()
+        for kind, title in [("car", "Отчёт по автомобилю"), ("expenses", "Отчёт по расходам"), ("schedule", "График ТО")]:
+            check = QCheckBox(title)
+            check.setChecked(True)
+            self.kind_checks[kind] = check
+            self.kind_layout.addWidget(check)
+        self.main_layout.addLayout(self.kind_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setValue(0)
+        self.main_layout.addWidget(self.progress_bar)
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(200)
+        self.progress_timer.timeout.connect(self.update_progress)
+
+        self.btn_layout = QHBoxLayout()
+        self.start_btn = QPushButton("Сформировать")
+        self.cancel_btn = QPushButton("Отмена")
+        self.close_btn = QPushButton("Закрыть")
+        for btn in [self.start_btn, self.cancel_btn, self.close_btn]:
+            StyleHelper.apply_button_style(btn)
+            self.btn_layout.addWidget(btn)
+        self.cancel_btn.setEnabled(False)
+        self.start_btn.clicked.connect(self.start)
+        self.cancel_btn.clicked.connect(self.cancel)
+        self.close_btn.clicked.connect(self.reject)
+        self.main_layout.addLayout(self.btn_layout)
+        self.setLayout(self.main_layout)
+
+    def show_cars(self, cars):
+        self.car_list.clear()
+        for car in cars:
+            item = QListWidgetItem(f"{car.mark} {car.model} ({car.number})")
+            item.setData(Qt.UserRole, car.car_id)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if self.all_check.isChecked() else Qt.Unchecked)
+            self.car_list.addItem(item)
+
+    def check_all(self, checked):
+        for row in range(self.car_list.count()):
+            item = self.car_list.item(row)
+            if item.flags() & Qt.ItemIsUserCheckable:
+                item.setCheckState(Qt.Checked if checked else Qt.Unchecked)
+
+    def selected_car_ids(self):
+        items = [self.car_list.item(row) for row in range(self.car_list.count())]
+        return [item.data(Qt.UserRole) for item in items if item.data(Qt.UserRole) is not None and item.checkState() == Qt.Checked]
+
+    def start(self, directory=None):
+        car_ids = self.selected_car_ids()
+        kinds = [kind for kind, check in self.kind_checks.items() if check.isChecked()]
+        if not car_ids or not kinds:
+            show_message("Ошибка", "Выберите автомобили и виды отчётов!", "warning")
+            return
+        directory = directory or QFileDialog.getExistingDirectory(self, "Папка для отчётов")
+        if not directory:
+            return
+        from batch import BatchReports
+        self.batch = BatchReports(car_ids, directory, kinds)
+        self.progress_bar.setMaximum(len(car_ids))
+        self.progress_bar.setValue(0)
+        self.start_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_timer.start()
+
+    def cancel(self):
+        if self.batch:
+            self.cancel_btn.setEnabled(False)
+            self.batch.cancel()
+
+    def update_progress(self):
+        done, total = self.batch.progress()
+        self.progress_bar.setValue(done)
+        if not self.batch.done():
+            return
+        self.progress_timer.stop()
+        self.batch.close()
+        self.start_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        paths, errors = self.batch.results()
+        text = f"Сформировано отчётов: {len(paths)}"
+        if self.batch.cancelled:
+            text += " (генерация отменена)"
+        if errors:
+            show_message("Ошибка", f"{text}. Ошибки:\n" + "\n".join(errors[:10]), "warning")
+        else:
+            show_message("Успех", text)
+
+    def reject(self):
+        self.cancel()
+        super().reject()
+
 # Диалог деталей автомобиля в архиве
 class CarDetailsDialog(BaseDialog):
+    @query_budget("open CarDetailsDialog", 4)
     def __init__(self, car):
         self.car = car
         super().__init__(f"Детали: {car.mark} {car.model}", size=(700, 450))
@@ -1438,8 +1811,7 @@ class CarDetailsDialog(BaseDialog):
 
         self.status_combo = QComboBox()
         StyleHelper.apply_widget_style(self.status_combo)
-        for status in session.query(Status).all():
-            self.status_combo.addItem(status.status, status.status_id)
+        fill_combo(self.status_combo, "status")
         self.status_combo.setCurrentIndex(self.status_combo.findData(self.car.status_id))
         self.status_combo.setEnabled(False)
         self.left_layout.addWidget(QLabel("Статус:"))
@@ -1448,12 +1820,11 @@ class CarDetailsDialog(BaseDialog):
         self.driver_combo = QComboBox()
         StyleHelper.apply_widget_style(self.driver_combo)
         self.driver_combo.addItem("Без водителя", None)
-        for driver in session.query(Driver).all():
-            self.driver_combo.addItem(f"{driver.surname} {driver.name}", driver.driver_id)
+        fill_combo(self.driver_combo, "driver")
         self.driver_combo.setCurrentIndex(self.driver_combo.findData(self.car.driver_id))
         self.driver_combo.setEnabled(False)
         self.left_layout.addWidget(QLabel("Водитель:"))
         self.left_layout.addWidget(self.driver_combo)
 
         self.left_layout.addStretch()
-        load_photo(self.car.photo, self.photo_label)
\ No newline at end of file
+        load_entity_photo(self.car, self.photo_label)
\ No newline at end of file
@@ -0,0 +1,261 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, select, insert, update, func, text
+from models import Base, Car, Driver, ServiceCar, ExpensesCar, engine
+from search import create_search_indexes
+from photos import photo_fields
+
+# Версионные миграции схемы:
+#   python migrations.py status
+#   python migrations.py upgrade [--verify]
+#   python migrations.py verify
+# Примененные версии записываются в таблицу schema_version, каждая версия - в своей транзакции.
+# Миграции не ломаются на базе, где часть объектов уже есть: первая версия создает по моделям
+# недостающие таблицы (в новой базе - сразу со всеми столбцами и индексами), следующие - недостающие
+# индексы и столбцы.
+# Проверки миграции - запросы экранов с параметрами из текущих данных: план запроса должен
+# использовать новый индекс (EXPLAIN ANALYZE в Postgres, EXPLAIN QUERY PLAN в SQLite).
+# Отложенные миграции (deferred) не нужны для работы экранов и при запуске приложения выполняются
+# в фоне. Миграция, которая вернула False, не записывается и будет выполнена при следующем запуске
+
+Migration = namedtuple("Migration", ["version", "description", "apply", "checks", "deferred"], defaults=[False])
+CheckResult = namedtuple("CheckResult", ["name", "index", "used", "before_ms", "after_ms"])
+
+version_table = Table("schema_version", MetaData(),
+                      Column("version", Integer, primary_key=True),
+                      Column("description", String(200)),
+                      Column("applied_at", DateTime))
+
+# Ключ advisory-блокировки Postgres: два клиента, запущенные одновременно, не применяют миграцию дважды
+MIGRATION_LOCK = 20240925
+# Повторы запроса для замера времени в SQLite, берется лучший
+TIMING_RUNS = 5
+PAGE = 200
+
+def create_tables(conn):
+    Base.metadata.create_all(conn)
+
+def create_indexes(*names):
+    def apply(conn):
+        tables = set()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name in names:
+                    index.create(conn, checkfirst=True)
+                    tables.add(table.name)
+        # Планировщику нужна свежая статистика по таблицам, иначе новый индекс может не использоваться
+        for table in sorted(tables):
+            conn.execute(text(f"ANALYZE {table}"))
+    return apply
+
+# Новые столбцы существующих таблиц: create_all таблицы, которые уже есть, не меняет.
+# Столбец: (таблица, имя, тип в Postgres, тип в SQLite)
+def add_columns(conn, columns):
+    for table, column, pg_type, sqlite_type in columns:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {pg_type}"))
+        elif column not in {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sqlite_type}"))
+
+PHOTO_COLUMNS = [
+    ("car", "photo_thumb", "BYTEA", "BLOB"),
+    ("car", "photo_hash", "VARCHAR(32)", "VARCHAR(32)"),
+    ("driver", "photo_thumb", "BYTEA", "BLOB"),
+    ("driver", "photo_hash", "VARCHAR(32)", "VARCHAR(32)"),
+]
+
+# Миниатюры и хэши для фото, сохраненных до появления этих столбцов: без хэша фото не попадает
+# в кэш картинок, а карточка остается без миниатюры. Фото читаются по одному; миниатюры
+# создаются без Qt, миграция выполняется и из консольных скриптов
+def backfill_photos(conn):
+    for table in (Car.__table__, Driver.__table__):
+        key = table.primary_key.columns.values()[0]
+        ids = [row_id for row_id, in conn.execute(select(key).where(table.c.photo != None, table.c.photo_hash == None))]
+        if not ids:
+            continue
+        for row_id in ids:
+            fields = photo_fields(conn.execute(select(table.c.photo).where(key == row_id)).scalar())
+            conn.execute(update(table).where(key == row_id)
+                         .values(photo_thumb=fields["photo_thumb"], photo_hash=fields["photo_hash"]))
+
+def add_photo_fields(conn):
+    add_columns(conn, PHOTO_COLUMNS)
+    backfill_photos(conn)
+
+# Параметры проверок из текущих данных: автомобили с самой длинной историей ТО и расходов
+def sample_values(conn):
+    def busiest(model):
+        return conn.execute(select(model.car_id).group_by(model.car_id)
+                            .order_by(func.count().desc(), model.car_id).limit(1)).scalar()
+    values = {
+        "service_car": busiest(ServiceCar),
+        "expense_car": busiest(ExpensesCar),
+        "number": conn.execute(select(Car.number).where(Car.number != None).order_by(Car.car_id.desc()).limit(1)).scalar(),
+    }
+    return values if all(value is not None for value in values.values()) else None
+
+# Проверка: (название, индекс, запрос по образцу из sample_values) - те же условия и сортировки,
+# что у запросов экранов, отчетов и консольных команд
+HOT_PATH_CHECKS = [
+    ("архив (ArchiveDialog)", "ix_car_archived",
+     lambda values: select(Car).where(Car.is_archived == True).order_by(Car.car_id)),
+    ("автомобиль по госномеру (cli --car)", "ix_car_number",
+     lambda values: select(Car.car_id).where(Car.number == values["number"])),
+    ("страница ТО (fetch_services)", "ix_service_car_car_id",
+     lambda values: select(ServiceCar).where(ServiceCar.car_id == values["service_car"])
+     .order_by(ServiceCar.service_car_id).limit(PAGE)),
+    ("последнее ТО (write_service)", "ix_service_car_car_date",
+     lambda values: select(ServiceCar.mileage_at_service).where(ServiceCar.car_id == values["service_car"])
+     .order_by(ServiceCar.date_service.desc()).limit(1)),
+    ("сроки ТО (fetch_due_services)", "ix_service_car_car_date",
+     lambda values: select(Car.car_id, Car.number, func.max(ServiceCar.date_service), func.max(ServiceCar.next_date))
+     .join(ServiceCar, ServiceCar.car_id == Car.car_id).where(Car.is_archived == False)
+     .group_by(Car.car_id, Car.number).having(func.max(ServiceCar.next_date) <= func.current_date())),
+    ("страница расходов (fetch_expenses)", "ix_expenses_car_car_id",
+     lambda values: select(ExpensesCar).where(ExpensesCar.car_id == values["expense_car"])
+     .order_by(ExpensesCar.expenses_car_id).limit(PAGE)),
+]
+
+MIGRATIONS = [
+    Migration(1, "Таблицы по моделям", create_tables, []),
+    Migration(2, "Индексы для запросов экранов и отчетов",
+              create_indexes("ix_car_archived", "ix_car_number", "ix_service_car_car_id",
+                             "ix_service_car_car_date", "ix_expenses_car_car_id"),
+              HOT_PATH_CHECKS),
+    Migration(3, "Миниатюры и хэши фото автомобилей и водителей", add_photo_fields, []),
+    Migration(4, "Триграммные индексы поиска (Postgres, pg_trgm)", create_search_indexes, [], deferred=True),
+]
+
+def applied_versions(conn):
+    version_table.create(conn, checkfirst=True)
+    return {version for version, in conn.execute(select(version_table.c.version))}
+
+def pending_migrations():
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+# План и время запроса. В Postgres - EXPLAIN ANALYZE: запрос выполняется, время берется из
+# "Execution Time"; SQLite времени в плане не сообщает, запрос выполняется отдельно
+def explain(conn, statement):
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True}))
+    if conn.dialect.name == "postgresql":
+        lines = [line for line, in conn.exec_driver_sql("EXPLAIN (ANALYZE, BUFFERS) " + sql)]
+        elapsed = next((float(line.split(":")[1].split()[0]) for line in lines if line.startswith("Execution Time")), None)
+        return "\n".join(lines), elapsed
+    plan = "\n".join(row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql))
+    best = None
+    for _ in range(TIMING_RUNS):
+        start = time.perf_counter()
+        conn.exec_driver_sql(sql).fetchall()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return plan, best
+
+def run_checks(checks, values):
+    results = {}
+    with engine.connect() as conn:
+        for name, index, build in checks:
+            results[name] = (index,) + explain(conn, build(values))
+    return results
+
+def compare(checks, before, after):
+    results = []
+    for name, index, _ in checks:
+        _, plan, after_ms = after[name]
+        before_ms = before[name][2] if name in before else None
+        results.append(CheckResult(name, index, index in plan, before_ms, after_ms))
+    return results
+
+def sample():
+    with engine.connect() as conn:
+        return sample_values(conn)
+
+# Применение недостающих версий по порядку. С verify=True проверки каждой миграции выполняются
+# до и после нее; deferred=False/True - только обычные или только отложенные миграции.
+# Возвращает [(миграция, результаты проверок)]
+def upgrade(verify=False, deferred=None):
+    applied = []
+    values = None
+    for migration in pending_migrations():
+        if deferred is not None and migration.deferred != deferred:
+            continue
+        # Образцы берутся перед первой миграцией с проверками: таблицы к этому моменту уже есть
+        if verify and migration.checks and values is None:
+            values = sample()
+        before = run_checks(migration.checks, values) if values else {}
+        with engine.begin() as conn:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK})
+            # Версию мог применить другой клиент, пока эта транзакция ждала блокировку
+            if migration.version in applied_versions(conn):
+                continue
+            if migration.apply(conn) is False:
+                continue
+            conn.execute(insert(version_table).values(version=migration.version, description=migration.description,
+                                                      applied_at=datetime.now()))
+        results = compare(migration.checks, before, run_checks(migration.checks, values)) if values and migration.checks else []
+        applied.append((migration, results))
+    return applied
+
+# Проверки уже примененных миграций на текущих данных
+def verify():
+    values = sample()
+    if values is None:
+        return None
+    with engine.begin() as conn:
+        applied = applied_versions(conn)
+    checks = [check for migration in MIGRATIONS if migration.version in applied for check in migration.checks]
+    return compare(checks, {}, run_checks(checks, values))
+
+# Удаление всех таблиц вместе с журналом версий (fleet.py --reset)
+def drop_schema():
+    Base.metadata.drop_all(engine)
+    version_table.drop(engine, checkfirst=True)
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.2f} мс"
+
+def print_results(results):
+    for result in results:
+        used = "используется" if result.used else "НЕ используется"
+        timing = format_ms(result.after_ms) if result.before_ms is None \
+            else f"{format_ms(result.before_ms)} -> {format_ms(result.after_ms)}"
+        print(f"  {result.name}: {timing}, индекс {result.index} {used}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы базы учета автопарка")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="текущая версия и недостающие миграции")
+    upgrade_parser = commands.add_parser("upgrade", help="применить недостающие миграции")
+    upgrade_parser.add_argument("--verify", action="store_true",
+                                help="сравнить планы и время запросов до и после каждой миграции")
+    commands.add_parser("verify", help="проверить, что запросы используют индексы примененных миграций")
+    args = parser.parse_args()
+    failed = False
+    if args.command == "status":
+        with engine.begin() as conn:
+            applied = applied_versions(conn)
+        print(f"Версия схемы: {max(applied, default=0)}")
+        for migration in pending_migrations():
+            print(f"  не применена {migration.version}: {migration.description}")
+    elif args.command == "upgrade":
+        applied = upgrade(args.verify)
+        if not applied:
+            print("Схема актуальна")
+        for migration, results in applied:
+            print(f"Применена версия {migration.version}: {migration.description}")
+            if args.verify and migration.checks and not results:
+                print("  проверки пропущены: в базе нет данных (python fleet.py)")
+            print_results(results)
+            failed = failed or not all(result.used for result in results)
+    else:
+        results = verify()
+        if results is None:
+            raise SystemExit("В базе нет данных для проверки (python fleet.py)")
+        print_results(results)
+        failed = not all(result.used for result in results)
+    sys.exit(1 if failed else 0)
\ No newline at end of file
@@ -0,0 +1,176 @@
+from models import Car, CAR_CARD_OPTIONS
+
+# Страница автомобилей по ключу car_id: "first" и "last" - начало и конец списка, "after" и "before" -
+# соседняя страница окна, "around" - окно вокруг car_id (если его нет среди выбранных, берется следующий,
+# а если нет и следующих - конец списка)
+def car_page(session, archived, direction, car_id, window):
+    query = session.query(Car).options(*CAR_CARD_OPTIONS).filter(Car.is_archived == archived)
+
+    def after(key, limit, inclusive=False):
+        page = query if key is None else query.filter(Car.car_id >= key if inclusive else Car.car_id > key)
+        return page.order_by(Car.car_id).limit(limit).all()
+
+    def before(key, limit):
+        page = query if key is None else query.filter(Car.car_id < key)
+        return list(reversed(page.order_by(Car.car_id.desc()).limit(limit).all()))
+
+    if direction in ("first", "after"):
+        return after(car_id, window)
+    if direction in ("last", "before"):
+        return before(car_id, window)
+    cars = after(car_id, window, inclusive=True)
+    if not cars:
+        return before(None, window)
+    return before(car_id, window // 2) + cars
+
+# Курсор по автомобилям: в памяти держится только окно соседних записей,
+# соседи подгружаются keyset-пагинацией по car_id
+class CarCursor:
+    def __init__(self, session, archived=False, window=10, prefetch=3):
+        self.session = session
+        self.archived = archived
+        self.window = window
+        self.prefetch = prefetch
+        self.cars = []
+        self.index = 0
+        self.has_before = False
+        self.has_after = False
+        # Страница, без которой next/prev с load=False не могут перейти по кругу
+        self.wrap = None
+
+    def page(self, direction, car_id=None):
+        return car_page(self.session, self.archived, direction, car_id, self.window)
+
+    def current(self):
+        if self.cars and 0 <= self.index < len(self.cars):
+            return self.cars[self.index]
+        return None
+
+    # Соседние автомобили, уже загруженные в окно
+    def neighbours(self):
+        return [self.cars[i] for i in (self.index - 1, self.index + 1) if 0 <= i < len(self.cars) and i != self.index]
+
+    # cars - уже загруженная страница, например из фоновой задачи
+    def first(self, cars=None):
+        self.cars = self.page("first") if cars is None else cars
+        self.index = 0
+        self.wrap = None
+        self.has_before = False
+        self.has_after = len(self.cars) == self.window
+        return self.current()
+
+    def last(self, cars=None):
+        self.cars = self.page("last") if cars is None else cars
+        self.index = max(len(self.cars) - 1, 0)
+        self.wrap = None
+        self.has_before = len(self.cars) == self.window
+        self.has_after = False
+        return self.current()
+
+    # Окно вокруг заданного автомобиля; если его нет среди выбранных, берется следующий
+    def jump_to(self, car_id, cars=None):
+        if cars is None:
+            cars = self.page("around", car_id)
+        before = [car for car in cars if car.car_id < car_id]
+        after = cars[len(before):]
+        if not after:
+            return self.last(cars)
+        self.cars = cars
+        self.index = len(before)
+        self.wrap = None
+        self.has_before = len(before) == self.window // 2
+        self.has_after = len(after) == self.window
+        return self.current()
+
+    def reload(self):
+        car = self.current()
+        return self.jump_to(car.car_id) if car else self.first()
+
+    def need_after(self):
+        return self.has_after and self.index + self.prefetch >= len(self.cars) - 1
+
+    def need_before(self):
+        return self.has_before and self.index - self.prefetch <= 0
+
+    # Страница, которую окну пора подгрузить: (направление, car_id) или None. С next/prev(load=False)
+    # вызывающий загружает ее сам, например в фоне, и передает в add_page
+    def pending_page(self):
+        if self.wrap:
+            return self.wrap, None
+        if not self.cars:
+            return None
+        if self.need_after():
+            return "after", self.cars[-1].car_id
+        if self.need_before():
+            return "before", self.cars[0].car_id
+        return None
+
+    def add_page(self, direction, car_id, cars):
+        if direction == "first":
+            return self.first(cars)
+        if direction == "last":
+            return self.last(cars)
+        if direction == "around":
+            return self.jump_to(car_id, cars)
+        # Окно могло смениться, пока страница загружалась
+        if direction == "after" and self.cars and self.cars[-1].car_id == car_id:
+            self._add_forward(cars)
+        elif direction == "before" and self.cars and self.cars[0].car_id == car_id:
+            self._add_backward(cars)
+        return self.current()
+
+    # None без перехода: список пуст или (при load=False) нужная страница еще не загружена
+    def next(self, load=True):
+        if not self.cars:
+            return None
+        if load and self.need_after():
+            self._add_forward(self.page("after", self.cars[-1].car_id))
+        if self.index + 1 < len(self.cars):
+            self.index += 1
+            return self.current()
+        if self.has_after:
+            return None
+        # Конец списка - переход по кругу к первому автомобилю
+        if not self.has_before:
+            self.index = 0
+            return self.current()
+        if not load:
+            self.wrap = "first"
+            return None
+        return self.first()
+
+    def prev(self, load=True):
+        if not self.cars:
+            return None
+        if load and self.need_before():
+            self._add_backward(self.page("before", self.cars[0].car_id))
+        if self.index > 0:
+            self.index -= 1
+            return self.current()
+        if self.has_before:
+            return None
+        if not self.has_after:
+            self.index = len(self.cars) - 1
+            return self.current()
+        if not load:
+            self.wrap = "last"
+            return None
+        return self.last()
+
+    def _add_forward(self, more):
+        self.has_after = len(more) == self.window
+        self.cars.extend(more)
+        overflow = len(self.cars) - 2 * self.window
+        if overflow > 0:
+            del self.cars[:overflow]
+            self.index -= overflow
+            self.has_before = True
+
+    def _add_backward(self, more):
+        self.has_before = len(more) == self.window
+        self.cars[:0] = more
+        self.index += len(more)
+        overflow = len(self.cars) - 2 * self.window
+        if overflow > 0:
+            del self.cars[-overflow:]
+            self.has_after = True
\ No newline at end of file
@@ -0,0 +1,34 @@
+import hashlib
+import io
+
+# Миниатюры и хэши фото без Qt: их используют окно, миграции схемы и консольные скрипты.
+# Pillow приходит вместе с ReportLab и импортируется только при создании миниатюры
+
+THUMB_SIZE = (300, 300)
+
+def photo_hash(photo_data):
+    return hashlib.md5(photo_data).hexdigest()
+
+# Уменьшенная копия фото под размер карточки, хранится рядом с оригиналом
+def make_thumbnail(photo_data, size=THUMB_SIZE):
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(photo_data))
+        image.load()
+    except (OSError, Image.DecompressionBombError):
+        return None
+    alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if image.width > size[0] or image.height > size[1]:
+        image.thumbnail(size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    if alpha:
+        image.save(buffer, "PNG")
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+# Значения полей фото для Car и Driver
+def photo_fields(photo_data):
+    if not photo_data:
+        return {"photo": None, "photo_thumb": None, "photo_hash": None}
+    return {"photo": photo_data, "photo_thumb": make_thumbnail(photo_data), "photo_hash": photo_hash(photo_data)}
\ No newline at end of file
@@ -0,0 +1,174 @@
+from sqlalchemy import func
+from models import Car, Driver, Address, ServiceCar, ExpensesCar, TypeWork, TypeExpenses, session_scope, CAR_CARD_OPTIONS
+from instrumentation import query_budget
+from navigation import car_page
+
+# Запросы для фоновых задач: каждая функция работает в своей короткой сессии
+# и возвращает простые строки, которые можно передать в GUI-поток
+
+# Страница списка по ключу: записи с id больше after_id; limit=None - все оставшиеся
+@query_budget("load services", 1)
+def fetch_services(car_id, after_id=None, limit=None):
+    with session_scope() as scoped:
+        query = scoped.query(ServiceCar.service_car_id, ServiceCar.date_service, TypeWork.type, ServiceCar.next_date,
+                             ServiceCar.mileage_at_service, ServiceCar.conclusion)\
+            .outerjoin(TypeWork, ServiceCar.type_work_id == TypeWork.type_work_id)\
+            .filter(ServiceCar.car_id == car_id)
+        if after_id is not None:
+            query = query.filter(ServiceCar.service_car_id > after_id)
+        return query.order_by(ServiceCar.service_car_id).limit(limit).all()
+
+@query_budget("load expenses", 1)
+def fetch_expenses(car_id, after_id=None, limit=None):
+    with session_scope() as scoped:
+        query = scoped.query(ExpensesCar.expenses_car_id, TypeExpenses.type_expenses, ExpensesCar.sum, ExpensesCar.date_expenses)\
+            .outerjoin(TypeExpenses, ExpensesCar.type_expenses_id == TypeExpenses.type_expenses_id)\
+            .filter(ExpensesCar.car_id == car_id)
+        if after_id is not None:
+            query = query.filter(ExpensesCar.expenses_car_id > after_id)
+        return query.order_by(ExpensesCar.expenses_car_id).limit(limit).all()
+
+# Первая страница главного окна. Автомобили отсоединяются от сессии до commit, чтобы сохранить
+# загруженные поля; GUI-поток переносит их в свою сессию через merge
+@query_budget("load first cars", 1)
+def fetch_first_cars(limit):
+    with session_scope() as scoped:
+        cars = scoped.query(Car).options(*CAR_CARD_OPTIONS).filter(Car.is_archived == False)\
+            .order_by(Car.car_id).limit(limit).all()
+        scoped.expunge_all()
+        return cars
+
+# Страница курсора главного окна (navigation.car_page); "around" - два запроса
+@query_budget("load car page", 2)
+def fetch_car_page(archived, direction, car_id, window):
+    with session_scope() as scoped:
+        cars = car_page(scoped, archived, direction, car_id, window)
+        scoped.expunge_all()
+        return cars
+
+# Автомобиль для обновления карточки
+@query_budget("refresh car card", 1)
+def fetch_car(car_id):
+    with session_scope() as scoped:
+        car = scoped.query(Car).options(*CAR_CARD_OPTIONS).filter(Car.car_id == car_id).one_or_none()
+        scoped.expunge_all()
+        return car
+
+# Записи для диалогов редактирования ТО и расходов
+def fetch_service(service_id):
+    with session_scope() as scoped:
+        service = scoped.query(ServiceCar).get(service_id)
+        scoped.expunge_all()
+        return service
+
+def fetch_expense(expense_id):
+    with session_scope() as scoped:
+        expense = scoped.query(ExpensesCar).get(expense_id)
+        scoped.expunge_all()
+        return expense
+
+@query_budget("load archive", 1)
+def fetch_archived_cars():
+    with session_scope() as scoped:
+        return scoped.query(Car.car_id, Car.mark, Car.model, Car.number)\
+            .filter(Car.is_archived == True).order_by(Car.car_id).all()
+
+@query_budget("load fleet", 1)
+def fetch_active_cars():
+    with session_scope() as scoped:
+        return scoped.query(Car.car_id, Car.mark, Car.model, Car.number)\
+            .filter(Car.is_archived == False).order_by(Car.car_id).all()
+
+# Автомобили, у которых плановое ТО (самая поздняя следующая дата) наступает не позже until
+@query_budget("load due services", 1)
+def fetch_due_services(until, car_ids=None):
+    last_service = func.max(ServiceCar.date_service)
+    next_date = func.max(ServiceCar.next_date)
+    with session_scope() as scoped:
+        query = scoped.query(Car.car_id, Car.mark, Car.model, Car.number, Car.mileage, last_service, next_date)\
+            .join(ServiceCar, ServiceCar.car_id == Car.car_id)\
+            .filter(Car.is_archived == False)
+        if car_ids:
+            query = query.filter(Car.car_id.in_(car_ids))
+        return query.group_by(Car.car_id, Car.mark, Car.model, Car.number, Car.mileage)\
+            .having(next_date <= until).order_by(next_date).all()
+
+def archive_car(car_id):
+    with session_scope() as scoped:
+        scoped.query(Car).filter(Car.car_id == car_id).update({Car.is_archived: True})
+    return car_id
+
+def unarchive_car(car_id):
+    with session_scope() as scoped:
+        scoped.query(Car).filter(Car.car_id == car_id).update({Car.is_archived: False})
+    return car_id
+
+# Сохранение водителя вместе с адресом; driver_id=None - новый водитель
+def write_driver(driver_id, fields, address_fields):
+    with session_scope() as scoped:
+        driver = scoped.query(Driver).get(driver_id) if driver_id else Driver()
+        if any(value is not None for value in address_fields.values()):
+            address = scoped.query(Address).get(driver.address_id) if driver.address_id else None
+            if address is None:
+                address = Address()
+                scoped.add(address)
+            for field, value in address_fields.items():
+                setattr(address, field, value)
+            scoped.flush()
+            driver.address_id = address.address_id
+        else:
+            driver.address_id = None
+        for field, value in fields.items():
+            setattr(driver, field, value)
+        scoped.add(driver)
+        scoped.flush()
+        return driver.driver_id
+
+# Удаление через сессию, а не массовым delete(): after_flush сбрасывает кэш справочника водителей
+def remove_driver(driver_id):
+    with session_scope() as scoped:
+        driver = scoped.query(Driver).get(driver_id)
+        if driver is not None:
+            scoped.delete(driver)
+    return driver_id
+
+# Сохранение автомобиля; car_id=None - новый автомобиль
+def write_car(car_id, fields):
+    with session_scope() as scoped:
+        car = scoped.query(Car).get(car_id) if car_id else Car(is_archived=False)
+        for field, value in fields.items():
+            setattr(car, field, value)
+        scoped.add(car)
+        scoped.flush()
+        return car.car_id
+
+# Запись о ТО и пробег автомобиля по последнему ТО в одной транзакции; service_id=None - новая
+# запись, fields=None - удаление. Возвращает пробег по последнему ТО или None, если его нет
+def write_service(car_id, service_id, fields):
+    with session_scope() as scoped:
+        service = scoped.query(ServiceCar).get(service_id) if service_id else ServiceCar(car_id=car_id)
+        if fields is None:
+            scoped.delete(service)
+        else:
+            for field, value in fields.items():
+                setattr(service, field, value)
+            scoped.add(service)
+        scoped.flush()
+        latest = scoped.query(ServiceCar.mileage_at_service).filter(ServiceCar.car_id == car_id)\
+            .order_by(ServiceCar.date_service.desc()).first()
+        if latest is None or latest.mileage_at_service is None:
+            return None
+        scoped.query(Car).filter(Car.car_id == car_id).update({Car.mileage: latest.mileage_at_service})
+        return latest.mileage_at_service
+
+# Запись о расходе; expense_id=None - новая запись, fields=None - удаление
+def write_expense(car_id, expense_id, fields):
+    with session_scope() as scoped:
+        expense = scoped.query(ExpensesCar).get(expense_id) if expense_id else ExpensesCar(car_id=car_id)
+        if fields is None:
+            scoped.delete(expense)
+        else:
+            for field, value in fields.items():
+                setattr(expense, field, value)
+            scoped.add(expense)
+        return car_id
\ No newline at end of file
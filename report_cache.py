@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import config
+
+# Кэш готовых PDF на диске по отпечатку входных данных. Время изменения файла обновляется
+# при каждом попадании, при превышении размера удаляются давно не использованные отчеты
+class ReportCache:
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    # Копия отчета из кэша в file_path; False, если отчета нет
+    def fetch(self, key, file_path):
+        cached = self.path(key)
+        try:
+            shutil.copyfile(cached, file_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        # Копия уже сделана; отчет мог удалить при вытеснении другой процесс
+        try:
+            os.utime(cached)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return True
+
+    def store(self, key, file_path):
+        os.makedirs(self.directory, exist_ok=True)
+        # Запись через временный файл: параллельные процессы не увидят недописанный отчет
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(handle)
+        shutil.copyfile(file_path, temp_path)
+        os.replace(temp_path, self.path(key))
+        self.evict()
+
+    # Кэш делят параллельные процессы (пакетные отчеты, консольные задания): файл, удаленный
+    # другим процессом между чтением папки и stat или remove, пропускается
+    def entries(self):
+        try:
+            files = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".pdf")]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for entry in files:
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            total -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        entries = self.entries()
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "files": len(entries), "bytes": sum(size for _, size, _ in entries)}
+
+report_cache = ReportCache(config.REPORT_CACHE_DIR, config.REPORT_CACHE_SIZE_MB * 1024 * 1024)
\ No newline at end of file
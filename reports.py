@@ -0,0 +1,361 @@
+import hashlib
+import os
+import tempfile
+from datetime import date
+from itertools import islice
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.graphics.shapes import Drawing, Line, String
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from sqlalchemy import func, extract
+from models import Car, Driver, Status, ServiceCar, ExpensesCar, TypeWork, TypeExpenses, session_scope, CAR_CARD_OPTIONS
+from report_cache import report_cache
+
+# Отчеты в PDF без зависимостей от Qt: годятся и для диалогов, и для пакетной генерации в процессах
+
+FONT_NAME = "DejaVuSans"
+# Шрифт лежит рядом с модулем: отчеты строятся при любой текущей папке
+FONT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DejaVuSans.ttf")
+
+# Шрифт разбирается один раз на процесс; в PDF попадает только подмножество использованных глифов
+def register_font():
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+# Стили отчетов создаются один раз как копии стандартных и больше не изменяются
+_sample = getSampleStyleSheet()
+TITLE_STYLE = ParagraphStyle("ReportTitle", parent=_sample["Title"], fontName=FONT_NAME)
+TEXT_STYLE = ParagraphStyle("ReportText", parent=_sample["Normal"], fontName=FONT_NAME, fontSize=12)
+SMALL_TEXT_STYLE = ParagraphStyle("ReportSmallText", parent=_sample["Normal"], fontName=FONT_NAME, fontSize=10)
+HEADING_STYLE = ParagraphStyle("ReportHeading", parent=_sample["Heading3"], fontName=FONT_NAME)
+EXPENSES_TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), FONT_NAME),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+])
+
+class ReportCancelled(Exception):
+    pass
+
+# Документ, который дочитывает элементы из генератора по мере верстки: в памяти
+# держится только текущий элемент и следующий за ним, а не весь отчет.
+# После каждой страницы вызывается progress(номер страницы) и проверяется cancelled()
+class StreamingDocTemplate(SimpleDocTemplate):
+    def __init__(self, filename, progress=None, cancelled=None, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.pending = iter(())
+        self.progress = progress
+        self.cancelled = cancelled
+
+    def stream(self, flowables):
+        self.pending = iter(flowables)
+
+    def build(self, flowables, **kwargs):
+        self.flowables = flowables
+        self.top_up(flowables)
+        super().build(flowables, **kwargs)
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        # Служебные списки ReportLab (висячие элементы) не дополняются
+        if flowables is self.flowables:
+            self.top_up(flowables)
+
+    def handle_pageEnd(self):
+        if self.cancelled and self.cancelled():
+            raise ReportCancelled(f"Формирование отчёта отменено на странице {self.page}")
+        if self.progress:
+            self.progress(self.page)
+        super().handle_pageEnd()
+
+    def top_up(self, flowables):
+        while len(flowables) < 2:
+            flowable = next(self.pending, None)
+            if flowable is None:
+                return
+            flowables.append(flowable)
+
+# Новый документ с заголовком отчета
+def start_report(file_path, title, progress=None, cancelled=None):
+    register_font()
+    doc = StreamingDocTemplate(file_path, progress, cancelled, pagesize=A4)
+    return doc, [Paragraph(title, TITLE_STYLE), Spacer(1, 12)]
+
+# Строк в одном куске таблицы: примерно страница A4 шрифтом 10
+TABLE_CHUNK_ROWS = 40
+
+# Длинная таблица кусками по странице с повторяющимся заголовком; rows читаются лениво
+def stream_table(header, rows, col_widths, style, chunk_rows=TABLE_CHUNK_ROWS):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        table = Table([header] + chunk, colWidths=col_widths, repeatRows=1)
+        table.setStyle(style)
+        yield table
+
+# Строки запроса читаются из курсора на сервере пачками, а не списком целиком
+STREAM_BATCH = 1000
+
+def load_car(scoped, car_id):
+    return scoped.query(Car).options(*CAR_CARD_OPTIONS).filter_by(car_id=car_id).one()
+
+# Строки расходов для подробной таблицы, читаются из курсора пачками
+def expense_rows(scoped, car_id):
+    return scoped.query(TypeExpenses.type_expenses, ExpensesCar.sum, ExpensesCar.date_expenses)\
+        .outerjoin(TypeExpenses, ExpensesCar.type_expenses_id == TypeExpenses.type_expenses_id)\
+        .filter(ExpensesCar.car_id == car_id).order_by(ExpensesCar.expenses_car_id)\
+        .yield_per(STREAM_BATCH)
+
+# ТО с датами для графика, по возрастанию даты
+def service_rows(scoped, car_id):
+    return scoped.query(ServiceCar.date_service, TypeWork.type, ServiceCar.next_date,
+                        ServiceCar.mileage_at_service, ServiceCar.conclusion)\
+        .outerjoin(TypeWork, ServiceCar.type_work_id == TypeWork.type_work_id)\
+        .filter(ServiceCar.car_id == car_id, ServiceCar.date_service != None)\
+        .order_by(ServiceCar.date_service, ServiceCar.service_car_id)
+
+# Отчет об автомобиле
+def car_report(car_id, file_path, progress=None, cancelled=None):
+    with session_scope() as scoped:
+        car = load_car(scoped, car_id)
+        doc, elements = start_report(file_path, f"Отчёт по автомобилю: {car.mark} {car.model}", progress, cancelled)
+
+        driver = car.driver
+        data = [
+            f"Марка: {car.mark}",
+            f"Модель: {car.model}",
+            f"Номер: {car.number}",
+            f"Пробег: {car.mileage} км",
+            f"Год: {car.year}",
+            f"Статус: {car.status.status}",
+            f"Водитель: {driver.surname} {driver.name} {driver.middle_name or ''}" if driver else "Водитель: Не назначен",
+        ]
+        for line in data:
+            elements.append(Paragraph(line, TEXT_STYLE))
+            elements.append(Spacer(1, 6))
+
+    doc.build(elements)
+    return file_path
+
+# Итоги расходов считаются в базе группировкой, строки расходов в Python не загружаются
+def expense_summary(scoped, car_id):
+    amount = func.coalesce(func.sum(ExpensesCar.sum), 0.0)
+    by_type = scoped.query(TypeExpenses.type_expenses, amount, func.count(ExpensesCar.expenses_car_id))\
+        .select_from(ExpensesCar)\
+        .outerjoin(TypeExpenses, ExpensesCar.type_expenses_id == TypeExpenses.type_expenses_id)\
+        .filter(ExpensesCar.car_id == car_id)\
+        .group_by(TypeExpenses.type_expenses).order_by(amount.desc()).all()
+    year = extract("year", ExpensesCar.date_expenses)
+    month = extract("month", ExpensesCar.date_expenses)
+    by_month = scoped.query(year, month, amount).filter(ExpensesCar.car_id == car_id, ExpensesCar.date_expenses != None)\
+        .group_by(year, month).order_by(year, month).all()
+    by_year = scoped.query(year, amount).filter(ExpensesCar.car_id == car_id, ExpensesCar.date_expenses != None)\
+        .group_by(year).order_by(year).all()
+    return by_type, by_month, by_year
+
+def summary_table(header, rows):
+    table = Table([header] + rows, colWidths=[200] + [100] * (len(header) - 1))
+    table.setStyle(EXPENSES_TABLE_STYLE)
+    return table
+
+def money(value):
+    return f"{value:.2f}"
+
+# Отчет по затратам на автомобиль
+def expenses_report(car_id, file_path, progress=None, cancelled=None):
+    with session_scope() as scoped:
+        car = load_car(scoped, car_id)
+        doc, elements = start_report(file_path, f"Отчёт по расходам на автомобиль: {car.mark} {car.model}", progress, cancelled)
+
+        by_type, by_month, by_year = expense_summary(scoped, car_id)
+        if not by_type:
+            elements.append(Paragraph("Расходы отсутствуют.", SMALL_TEXT_STYLE))
+        else:
+            total = sum(row[1] for row in by_type)
+            elements.append(Paragraph(f"Всего расходов: {money(total)}", TEXT_STYLE))
+            if car.mileage:
+                elements.append(Paragraph(f"Стоимость 1 км: {money(total / car.mileage)} (пробег {car.mileage} км)", TEXT_STYLE))
+            elements.append(Spacer(1, 12))
+            elements.append(Paragraph("По типам расходов", HEADING_STYLE))
+            elements.append(summary_table(["Тип расхода", "Сумма", "Записей"],
+                                          [[name or "Не указано", money(amount), str(count)] for name, amount, count in by_type]))
+            if by_year:
+                elements.append(Paragraph("По годам", HEADING_STYLE))
+                elements.append(summary_table(["Год", "Сумма"], [[str(int(y)), money(amount)] for y, amount in by_year]))
+                elements.append(Paragraph("По месяцам", HEADING_STYLE))
+                elements.append(summary_table(["Месяц", "Сумма"], [[f"{int(y)}-{int(m):02d}", money(amount)] for y, m, amount in by_month]))
+            elements.append(Paragraph("Все расходы", HEADING_STYLE))
+            rows = ([
+                type_name or "",
+                str(amount) if amount is not None else "0.0",
+                date_expenses.strftime('%Y-%m-%d') if date_expenses else ""
+            ] for type_name, amount, date_expenses in expense_rows(scoped, car_id))
+            doc.stream(stream_table(["Тип расхода", "Сумма", "Дата"], rows, [200, 100, 100], EXPENSES_TABLE_STYLE))
+
+        # Верстка внутри сессии: строки дочитываются из курсора по ходу построения
+        doc.build(elements)
+    return file_path
+
+# Разметка графика ТО: высота рисунка на листе, отступы оси и высоты подписей
+TIMELINE_HEIGHT = 600
+TIMELINE_TOP = TIMELINE_HEIGHT - 10
+TIMELINE_BOTTOM = 10
+TIMELINE_X = 50
+SERVICE_LABEL_HEIGHT = 22
+NEXT_LABEL_HEIGHT = 12
+
+# События графика: проведенные ТО и плановые даты, которые не совпали ни с одним ТО.
+# Событие - (порядковый номер даты, вид, строки подписи)
+def timeline_events(services):
+    service_dates = {date_service for date_service, *_ in services}
+    events = []
+    for date_service, type_name, next_date, mileage, conclusion in services:
+        events.append((date_service.toordinal(), "service", [
+            f"{date_service.strftime('%Y-%m-%d')} ({type_name or 'Не указано'})",
+            f"Пробег: {mileage or 0}, {conclusion or ''}",
+        ]))
+        if next_date and next_date not in service_dates:
+            service_dates.add(next_date)
+            events.append((next_date.toordinal(), "next", [f"След. ТО: {next_date.strftime('%Y-%m-%d')}"]))
+    events.sort(key=lambda event: event[0])
+    return events
+
+def label_height(event):
+    return SERVICE_LABEL_HEIGHT if event[1] == "service" else NEXT_LABEL_HEIGHT
+
+# Разбиение событий на листы: на лист попадает столько подписей, сколько помещается по высоте
+def timeline_pages(events):
+    page, used = [], 0
+    for event in events:
+        height = label_height(event)
+        if page and used + height > TIMELINE_TOP - TIMELINE_BOTTOM:
+            yield page
+            page, used = [], 0
+        page.append(event)
+        used += height
+    if page:
+        yield page
+
+# Подписи без наложений: проход сверху вниз сдвигает каждую подпись ниже предыдущей,
+# проход снизу вверх возвращает вылезшие за нижний край. Линейно по числу подписей
+def place_labels(ideal, heights, top, bottom):
+    placed = []
+    limit = top
+    for y, height in zip(ideal, heights):
+        y = min(y, limit)
+        placed.append(y)
+        limit = y - height
+    limit = bottom
+    for i in range(len(placed) - 1, -1, -1):
+        placed[i] = max(placed[i], limit + heights[i])
+        limit = placed[i]
+    return placed
+
+def timeline_drawing(page):
+    first, last = page[0][0], page[-1][0]
+    scale = (TIMELINE_TOP - TIMELINE_BOTTOM) / max(last - first, 1)
+    ticks = [TIMELINE_TOP - (ordinal - first) * scale for ordinal, _, _ in page]
+    heights = [label_height(event) for event in page]
+    # Первая строка подписи стоит на уровне своей отметки
+    labels = place_labels([tick + 3 for tick in ticks], heights, TIMELINE_TOP + 3, TIMELINE_BOTTOM)
+
+    drawing = Drawing(500, TIMELINE_HEIGHT)
+    drawing.add(Line(TIMELINE_X, TIMELINE_TOP, TIMELINE_X, TIMELINE_BOTTOM))
+    for (_, kind, lines), tick_y, label_y in zip(page, ticks, labels):
+        if kind == "service":
+            drawing.add(Line(TIMELINE_X, tick_y, TIMELINE_X + 20, tick_y))
+            text_x = TIMELINE_X + 25
+        else:
+            drawing.add(Line(TIMELINE_X, tick_y, TIMELINE_X + 10, tick_y, strokeDashArray=[4, 2]))
+            text_x = TIMELINE_X + 15
+        # Выноска от отметки к сдвинутой подписи
+        if abs(label_y - 3 - tick_y) > 1:
+            drawing.add(Line(text_x - 5, tick_y, text_x - 2, label_y - 5, strokeWidth=0.3))
+        for row, line in enumerate(lines):
+            drawing.add(String(text_x, label_y - 8 - 10 * row, line, fontName=FONT_NAME, fontSize=8))
+    return drawing
+
+def timeline_flowables(events):
+    for page in timeline_pages(events):
+        first, last = date.fromordinal(page[0][0]), date.fromordinal(page[-1][0])
+        yield Paragraph(f"{first.strftime('%Y-%m-%d')} — {last.strftime('%Y-%m-%d')}", SMALL_TEXT_STYLE)
+        yield timeline_drawing(page)
+
+# График ТО
+def service_schedule(car_id, file_path, progress=None, cancelled=None):
+    with session_scope() as scoped:
+        car = load_car(scoped, car_id)
+        doc, elements = start_report(file_path, f"График ТО для автомобиля: {car.mark} {car.model}", progress, cancelled)
+
+        services = service_rows(scoped, car_id).all()
+        if services:
+            doc.stream(timeline_flowables(timeline_events(services)))
+        elif scoped.query(ServiceCar.service_car_id).filter_by(car_id=car_id).first() is None:
+            elements.append(Paragraph("ТО отсутствуют.", SMALL_TEXT_STYLE))
+        else:
+            elements.append(Paragraph("Нет данных о датах ТО.", SMALL_TEXT_STYLE))
+
+    doc.build(elements)
+    return file_path
+
+# Виды отчетов: функция построения и префикс имени файла
+REPORTS = {
+    "car": (car_report, "Отчёт"),
+    "expenses": (expenses_report, "Расходы"),
+    "schedule": (service_schedule, "График_ТО"),
+}
+
+def report_file_name(kind, *parts):
+    name = "_".join([REPORTS[kind][1]] + [str(part) for part in parts])
+    return name.replace("/", "-").replace("\\", "-") + ".pdf"
+
+# Версия оформления отчетов: увеличивается при любом изменении верстки, чтобы не отдавать старые файлы из кэша
+REPORT_VERSION = 1
+
+# Отпечаток входных данных отчета: поля автомобиля и водителя, строки расходов или ТО,
+# версия оформления и файл шрифта
+def report_fingerprint(scoped, kind, car_id):
+    digest = hashlib.sha256(f"{kind}:{REPORT_VERSION}:{os.path.getsize(FONT_FILE)}\n".encode())
+    car = scoped.query(Car.car_id, Car.mark, Car.model, Car.number, Car.mileage, Car.year, Status.status,
+                       Driver.surname, Driver.name, Driver.middle_name)\
+        .outerjoin(Status, Car.status_id == Status.status_id)\
+        .outerjoin(Driver, Car.driver_id == Driver.driver_id)\
+        .filter(Car.car_id == car_id).one()
+    digest.update(repr(tuple(car)).encode())
+    rows = {"expenses": expense_rows, "schedule": service_rows}.get(kind)
+    if rows:
+        for row in rows(scoped, car_id):
+            digest.update(repr(tuple(row)).encode())
+    # Без ТО с датами график различает "ТО отсутствуют" и "Нет данных о датах ТО"
+    if kind == "schedule":
+        services = scoped.query(func.count(ServiceCar.service_car_id)).filter(ServiceCar.car_id == car_id).scalar()
+        digest.update(f"services:{services}\n".encode())
+    return digest.hexdigest()
+
+# Отчет через кэш: при неизменных данных файл копируется из кэша без верстки.
+# Отчет верстается во временный файл рядом с целевым и заменяет его только целиком: при отмене
+# или ошибке прежний файл пользователя остается, а недописанный в кэш не попадает
+def build_report(kind, car_id, file_path, cache=None, progress=None, cancelled=None):
+    cache = cache or report_cache
+    with session_scope() as scoped:
+        key = report_fingerprint(scoped, kind, car_id)
+    if cache.fetch(key, file_path):
+        return file_path
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), suffix=".tmp")
+    os.close(handle)
+    try:
+        REPORTS[kind][0](car_id, temp_path, progress, cancelled)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    cache.store(key, file_path)
+    return file_path
\ No newline at end of file
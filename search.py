@@ -0,0 +1,144 @@
+import heapq
+import logging
+from collections import defaultdict, namedtuple
+from sqlalchemy import func, or_, case, literal_column, text
+from sqlalchemy.exc import DBAPIError
+from models import Car
+
+log = logging.getLogger("kurs.search")
+
+SearchHit = namedtuple("SearchHit", ["car_id", "number", "title"])
+
+# Выражения поиска должны совпадать с выражениями GIN-индексов
+NUMBER_EXPR = func.lower(Car.number)
+TITLE_EXPR = func.lower(Car.mark + literal_column("' '") + Car.model)
+
+TRGM_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_car_number_trgm ON car USING gin (lower(number) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_car_title_trgm ON car USING gin (lower(mark || ' ' || model) gin_trgm_ops)",
+]
+
+def has_trigram(conn):
+    return conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+# Триграммные индексы для поиска подстрок в Postgres; выполняется миграцией в открытой транзакции.
+# Для CREATE EXTENSION нужны права CREATE на базу: без них и без уже установленного расширения
+# индексы не создаются и возвращается False, поиск работает через LIKE без ранжирования по сходству
+def create_search_indexes(conn):
+    if conn.dialect.name != "postgresql":
+        return True
+    if not has_trigram(conn):
+        try:
+            with conn.begin_nested():
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        except DBAPIError as e:
+            log.info("pg_trgm недоступно, поиск без триграммных индексов: %s", e.orig)
+            return False
+    for ddl in TRGM_DDL:
+        conn.execute(text(ddl))
+    return True
+
+def like_pattern(query):
+    return "%" + query.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+
+def grams(value, n=3):
+    return {value[i:i + n] for i in range(len(value) - n + 1)}
+
+# Триграммы слов с дополнением пробелами, как в pg_trgm
+def word_grams(value):
+    return set().union(*(grams(f"  {word} ") for word in value.split()))
+
+def similarity(a_grams, b_grams):
+    if not a_grams or not b_grams:
+        return 0.0
+    return len(a_grams & b_grams) / len(a_grams | b_grams)
+
+# N-граммный индекс в памяти для баз без pg_trgm
+class NgramIndex:
+    def __init__(self, n=3):
+        self.n = n
+        self.docs = {}
+        self.postings = defaultdict(set)
+        # Марки и модели в парке повторяются, поэтому их триграммы считаются один раз
+        self.title_grams = {}
+
+    def add(self, car_id, number, title):
+        number, title = (number or "").lower(), (title or "").lower()
+        self.docs[car_id] = (number, title)
+        if title not in self.title_grams:
+            self.title_grams[title] = grams(title, self.n)
+        for gram in grams(number, self.n) | self.title_grams[title]:
+            self.postings[gram].add(car_id)
+
+    def search(self, query, limit=20):
+        query = query.strip().lower()
+        if not query:
+            return []
+        query_grams = grams(query, self.n)
+        if query_grams:
+            postings = sorted((self.postings.get(gram, set()) for gram in query_grams), key=len)
+            candidates = set.intersection(*postings)
+        else:
+            candidates = self.docs.keys()
+        query_word_grams = word_grams(query)
+        scores = {}
+        hits = []
+        for car_id in candidates:
+            number, title = self.docs[car_id]
+            best = None
+            for value in (number, title):
+                if query not in value:
+                    continue
+                if value not in scores:
+                    # Для коротких запросов сходство по триграммам не информативно
+                    score = similarity(query_word_grams, word_grams(value)) if query_grams else 0.0
+                    scores[value] = (not value.startswith(query), -score)
+                best = scores[value] if best is None else min(best, scores[value])
+            if best is not None:
+                hits.append((best, car_id))
+        return [car_id for _, car_id in heapq.nsmallest(limit, hits)]
+
+# Поиск автомобилей по номеру или "марка модель" с ранжированием
+class CarSearch:
+    def __init__(self, session, archived=False):
+        self.session = session
+        self.archived = archived
+        self.index = None
+        self.rows = {}
+        self.trigram = None
+
+    def invalidate(self):
+        self.index = None
+        self.rows = {}
+
+    def search(self, query, limit=20):
+        query = query.strip().lower()
+        if not query:
+            return []
+        if self.session.get_bind().dialect.name == "postgresql":
+            if self.trigram is None:
+                self.trigram = has_trigram(self.session)
+            return self._search_sql(query, limit)
+        return self._search_memory(query, limit)
+
+    def _columns(self):
+        return self.session.query(Car.car_id, Car.number, Car.mark, Car.model).filter(Car.is_archived == self.archived)
+
+    def _search_sql(self, query, limit):
+        pattern = like_pattern(query)
+        prefix = pattern[1:]
+        order = [case((or_(NUMBER_EXPR.like(prefix, escape="/"), TITLE_EXPR.like(prefix, escape="/")), 0), else_=1)]
+        # similarity() есть только с расширением pg_trgm
+        if self.trigram:
+            order.append(func.greatest(func.similarity(NUMBER_EXPR, query), func.similarity(TITLE_EXPR, query)).desc())
+        rows = self._columns().filter(or_(NUMBER_EXPR.like(pattern, escape="/"), TITLE_EXPR.like(pattern, escape="/")))\
+            .order_by(*order, Car.car_id).limit(limit).all()
+        return [SearchHit(row.car_id, row.number, f"{row.mark} {row.model}") for row in rows]
+
+    def _search_memory(self, query, limit):
+        if self.index is None:
+            self.index = NgramIndex()
+            for row in self._columns():
+                self.index.add(row.car_id, row.number, f"{row.mark} {row.model}")
+                self.rows[row.car_id] = SearchHit(row.car_id, row.number, f"{row.mark} {row.model}")
+        return [self.rows[car_id] for car_id in self.index.search(query, limit)]
\ No newline at end of file
@@ -0,0 +1,95 @@
+from array import array
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from workers import run_in_background, show_error
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d') if value else ""
+
+def format_text(value):
+    return "" if value is None else str(value)
+
+def format_sum(value):
+    return "0.0" if value is None else str(value)
+
+# Таблица поверх массивов колонок с постраничной подгрузкой из базы.
+# columns - список (заголовок, функция форматирования); fetch(after_id, limit) возвращает
+# строки, первое поле которых - id записи, остальные идут в порядке колонок
+class PagedTableModel(QAbstractTableModel):
+    def __init__(self, columns, fetch, page_size=200, parent=None):
+        super().__init__(parent)
+        self.headers = [header for header, _ in columns]
+        self.formatters = [formatter for _, formatter in columns]
+        self.fetch = fetch
+        self.page_size = page_size
+        self.ids = array('q')
+        self.values = [[] for _ in columns]
+        self.exhausted = False
+        self.loading = False
+        self.generation = 0
+        # Вызывается после загрузки первой страницы, например для подгонки ширины колонок
+        self.on_first_page = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self.formatters[index.column()](self.values[index.column()][index.row()])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+    # Следующая страница загружается в фоне по ключу последней записи
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self.loading = True
+        after_id = self.ids[-1] if self.ids else None
+        generation = self.generation
+        run_in_background(self.fetch, after_id, self.page_size,
+                          on_done=lambda rows: self.append_page(rows, generation),
+                          on_error=lambda text: self.page_failed(text, generation))
+
+    def append_page(self, rows, generation):
+        if generation != self.generation:
+            return
+        first = len(self.ids)
+        self.loading = False
+        self.exhausted = len(rows) < self.page_size
+        if rows:
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self.ids.extend(row[0] for row in rows)
+            for column, values in enumerate(self.values, start=1):
+                values.extend(row[column] for row in rows)
+            self.endInsertRows()
+        if first == 0 and self.on_first_page:
+            self.on_first_page()
+
+    def page_failed(self, text, generation):
+        if generation == self.generation:
+            self.loading = False
+            self.exhausted = True
+        show_error(text)
+
+    # Сброс таблицы и загрузка с первой страницы
+    def reload(self):
+        self.beginResetModel()
+        self.generation += 1
+        self.ids = array('q')
+        self.values = [[] for _ in self.headers]
+        self.exhausted = False
+        self.loading = False
+        self.endResetModel()
+        self.fetchMore()
+
+    def row_id(self, row):
+        return self.ids[row] if 0 <= row < len(self.ids) else None
\ No newline at end of file
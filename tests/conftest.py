@@ -0,0 +1,32 @@
+import os
+import sys
+
+# База в памяти и проверка бюджетов запросов; переменные задаются до импорта config и models
+os.environ["KURS_DB_URL"] = "sqlite://"
+os.environ["KURS_QUERY_BUDGET"] = "1"
+os.environ["KURS_SQL_SUMMARY"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from models import session
+from migrations import upgrade
+from fleet import generate_fleet
+
+@pytest.fixture(scope="session", autouse=True)
+def fleet():
+    upgrade()
+    generate_fleet(30, services=4, expenses=4, photo_share=0, archived_share=0.1)
+
+# Сессия GUI-потока очищается после каждого теста, чтобы связи не брались из карты объектов
+@pytest.fixture(autouse=True)
+def gui_session():
+    yield session
+    session.remove()
+
+# Регрессия в стратегии загрузки: статус и водитель читаются по одному запросу на автомобиль
+@pytest.fixture
+def lazy_card(monkeypatch):
+    import navigation
+    import queries
+    monkeypatch.setattr(queries, "CAR_CARD_OPTIONS", ())
+    monkeypatch.setattr(navigation, "CAR_CARD_OPTIONS", ())
\ No newline at end of file
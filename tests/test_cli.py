@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Консольные команды в отдельном процессе, из чужой текущей папки: база, kurs.ini и кэш
+# отчетов - в KURS_HOME, шрифт - рядом с модулями
+def run(*args, home, cwd):
+    env = {name: value for name, value in os.environ.items() if not name.startswith("KURS_")}
+    env.update(KURS_HOME=str(home), KURS_DB_BACKEND="sqlite", PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, *args], cwd=cwd, env=env, capture_output=True, text=True, timeout=120)
+
+def test_report_from_other_cwd(tmp_path):
+    home, cwd, out = tmp_path / "home", tmp_path / "cwd", tmp_path / "out"
+    home.mkdir()
+    cwd.mkdir()
+    fleet = run(os.path.join(ROOT, "fleet.py"), "--cars", "3", "--services", "2", "--expenses", "2", "--photo-share", "0", home=home, cwd=cwd)
+    assert fleet.returncode == 0, fleet.stderr
+    report = run(os.path.join(ROOT, "cli.py"), "report", "--out", str(out), "--car", "2", home=home, cwd=cwd)
+    assert report.returncode == 0, report.stderr
+    assert sorted(os.listdir(out)) and all(name.endswith(".pdf") for name in os.listdir(out))
+    assert (home / "kurs.db").exists()
+    assert os.listdir(home / "report_cache")
+    assert os.listdir(cwd) == []
+
+# База до появления миниатюр: консольная команда обновляет схему и создает миниатюры без Qt
+def test_legacy_photos_backfilled_without_qt(tmp_path):
+    with open(os.path.join(ROOT, "car_icon.png"), "rb") as file:
+        photo = file.read()
+    db = sqlite3.connect(tmp_path / "kurs.db")
+    db.executescript("""
+        CREATE TABLE driver (driver_id INTEGER PRIMARY KEY, surname VARCHAR(50), name VARCHAR(50),
+            middle_name VARCHAR(50), phone VARCHAR(12), experience INTEGER, drivers_license_series INTEGER,
+            drivers_license_numbers INTEGER, address_id INTEGER, photo BLOB);
+        CREATE TABLE car (car_id INTEGER PRIMARY KEY, mark VARCHAR(50), model VARCHAR(50), number VARCHAR(9),
+            mileage INTEGER, year INTEGER, photo BLOB, status_id INTEGER, driver_id INTEGER, is_archived BOOLEAN);
+    """)
+    db.execute("INSERT INTO car (car_id, mark, model, number, photo, is_archived) VALUES (1, 'Lada', 'Vesta', 'А001АА77', ?, 0)",
+               (photo,))
+    db.commit()
+    db.close()
+    code = "import sys, cli; cli.main(['due']); print('PySide6' in sys.modules)"
+    result = run("-c", code, home=tmp_path, cwd=tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip().splitlines()[-1] == "False"
+    db = sqlite3.connect(tmp_path / "kurs.db")
+    thumb, photo_hash = db.execute("SELECT photo_thumb, photo_hash FROM car").fetchone()
+    db.close()
+    assert thumb and len(photo_hash) == 32
\ No newline at end of file
@@ -0,0 +1,32 @@
+from importer import import_csv
+from models import Car, Status, session_scope
+from queries import write_driver
+
+def write_csv(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+def test_duplicate_driver_name_is_ambiguous(tmp_path):
+    first = write_driver(None, {"surname": "Однофамильцев", "name": "Иван"}, {})
+    second = write_driver(None, {"surname": "Однофамильцев", "name": "Иван"}, {})
+    with session_scope() as scoped:
+        status = scoped.query(Status.status).first()[0]
+    header = "mark;model;number;mileage;year;status;driver"
+    result = import_csv("cars", write_csv(tmp_path / "cars.csv", [
+        header, f"Lada;Vesta;Т001ТТ77;1000;2020;{status};Однофамильцев Иван"]))
+    assert result.rows == 0
+    assert "неоднозначное значение" in result.errors[0]
+
+    result = import_csv("cars", write_csv(tmp_path / "cars.csv", [
+        header, f"Lada;Vesta;Т002ТТ77;1000;2020;{status};{second}"]))
+    assert result.errors == [] and result.rows == 1
+    with session_scope() as scoped:
+        assert scoped.query(Car.driver_id).filter(Car.number == "Т002ТТ77").scalar() == second != first
+
+def test_unknown_driver_id(tmp_path):
+    with session_scope() as scoped:
+        status = scoped.query(Status.status).first()[0]
+    result = import_csv("cars", write_csv(tmp_path / "cars.csv", [
+        "mark;model;number;mileage;year;status;driver", f"Lada;Vesta;Т003ТТ77;1000;2020;{status};999999"]))
+    assert result.rows == 0
+    assert "не найден id 999999" in result.errors[0]
\ No newline at end of file
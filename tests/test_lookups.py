@@ -0,0 +1,13 @@
+from lookups import lookup_cache
+from queries import write_driver, remove_driver
+
+def driver_ids():
+    return [item_id for item_id, _ in lookup_cache.get("driver")]
+
+def test_write_and_remove_driver_invalidate_cache():
+    before = driver_ids()
+    driver_id = write_driver(None, {"surname": "Тестов", "name": "Тест"}, {})
+    assert driver_id not in before
+    assert driver_id in driver_ids()
+    remove_driver(driver_id)
+    assert driver_id not in driver_ids()
\ No newline at end of file
@@ -0,0 +1,116 @@
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import func, text
+import queries
+from instrumentation import query_budget, QueryBudgetExceeded
+from models import Car, ServiceCar, ExpensesCar, session, session_scope
+from navigation import CarCursor
+from queries import fetch_first_cars, fetch_car, fetch_car_page, fetch_services, fetch_expenses
+
+# Поля, которые показывает карточка автомобиля
+def render(car):
+    return (car.mark, car.model, car.number, car.mileage,
+            car.status.status if car.status else None,
+            car.driver.surname if car.driver else None)
+
+def any_car_with(model):
+    with session_scope() as scoped:
+        return scoped.query(model.car_id).group_by(model.car_id).having(func.count() > 2).first()[0]
+
+# Регрессия в фоновой функции: лишний запрос на каждую короткую сессию
+@pytest.fixture
+def extra_query(monkeypatch):
+    scope = queries.session_scope
+
+    @contextmanager
+    def chatty_scope():
+        with scope() as scoped:
+            scoped.execute(text("SELECT 1"))
+            yield scoped
+
+    monkeypatch.setattr(queries, "session_scope", chatty_scope)
+
+def show_first_cars(limit):
+    with query_budget("show first cars", 1):
+        return [render(session.merge(car, load=False)) for car in fetch_first_cars(limit)]
+
+def test_first_cars():
+    cars = show_first_cars(10)
+    assert len(cars) == 10
+
+def test_first_cars_extra_query(extra_query):
+    with pytest.raises(QueryBudgetExceeded):
+        fetch_first_cars(10)
+
+def test_first_cars_lazy_relations(lazy_card):
+    with pytest.raises(QueryBudgetExceeded):
+        show_first_cars(10)
+
+def walk(cursor):
+    seen = [cursor.first().car_id]
+    while True:
+        with query_budget("navigate cars", 1):
+            car = cursor.next()
+            render(car)
+        if car.car_id == seen[0]:
+            return seen
+        seen.append(car.car_id)
+
+def test_cursor_next():
+    with session_scope() as scoped:
+        active = scoped.query(func.count(Car.car_id)).filter(Car.is_archived == False).scalar()
+    seen = walk(CarCursor(session, window=5, prefetch=1))
+    assert len(seen) == active
+    assert seen == sorted(seen)
+
+def test_cursor_next_lazy_relations(lazy_card):
+    with pytest.raises(QueryBudgetExceeded):
+        walk(CarCursor(session, window=5, prefetch=1))
+
+def test_car_page_around():
+    car_id = fetch_first_cars(10)[5].car_id
+    cars = fetch_car_page(False, "around", car_id, 6)
+    assert car_id in [car.car_id for car in cars]
+
+def test_car_page_extra_query(extra_query):
+    with session_scope() as scoped:
+        car_id = scoped.query(Car.car_id).filter(Car.is_archived == False).order_by(Car.car_id).offset(5).first()[0]
+    with pytest.raises(QueryBudgetExceeded):
+        fetch_car_page(False, "around", car_id, 6)
+
+def test_services_and_expenses():
+    car_id = any_car_with(ServiceCar)
+    services = fetch_services(car_id)
+    assert len(services) > 2
+    assert fetch_services(car_id, after_id=services[0].service_car_id, limit=1)[0] == services[1]
+    car_id = any_car_with(ExpensesCar)
+    expenses = fetch_expenses(car_id)
+    assert len(expenses) > 2
+    assert fetch_expenses(car_id, after_id=expenses[0].expenses_car_id, limit=1)[0] == expenses[1]
+
+def test_services_extra_query(extra_query):
+    with pytest.raises(QueryBudgetExceeded):
+        fetch_services(any_car_with(ServiceCar))
+
+def test_expenses_extra_query(extra_query):
+    with pytest.raises(QueryBudgetExceeded):
+        fetch_expenses(any_car_with(ExpensesCar))
+
+# Обновление карточки: фоновый fetch_car и показ в сессии GUI-потока
+def refresh_card(car_id):
+    with query_budget("refresh car card", 1):
+        return render(session.merge(fetch_car(car_id), load=False))
+
+def test_card_refresh():
+    car_id = fetch_first_cars(1)[0].car_id
+    mark, model, number, mileage, status, driver = refresh_card(car_id)
+    assert status is not None and driver is not None
+
+def test_card_refresh_extra_query(extra_query):
+    with pytest.raises(QueryBudgetExceeded):
+        fetch_car(1)
+
+def test_card_refresh_lazy_relations(lazy_card):
+    car_id = fetch_first_cars(1)[0].car_id
+    with pytest.raises(QueryBudgetExceeded):
+        refresh_card(car_id)
\ No newline at end of file
@@ -0,0 +1,46 @@
+import os
+import report_cache
+from report_cache import ReportCache
+
+def make_cache(tmp_path, max_bytes, count):
+    cache = ReportCache(str(tmp_path / "cache"), max_bytes)
+    source = tmp_path / "report.pdf"
+    source.write_bytes(b"%PDF" + b"0" * 1000)
+    for key in range(count):
+        cache.store(str(key), str(source))
+    return cache
+
+# Другой процесс удаляет файл между чтением папки и stat/remove
+def racing_scandir(monkeypatch):
+    scandir = os.scandir
+
+    def scandir_and_evict(path):
+        entries = list(scandir(path))
+        if entries:
+            os.remove(entries[0].path)
+        return iter(entries)
+
+    monkeypatch.setattr(report_cache.os, "scandir", scandir_and_evict)
+
+def test_entries_skip_files_removed_by_another_process(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, 10 ** 6, 3)
+    racing_scandir(monkeypatch)
+    assert len(cache.entries()) == 2
+
+def test_evict_and_clear_race(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, 10 ** 6, 4)
+    cache.max_bytes = 1100
+    racing_scandir(monkeypatch)
+    cache.evict()
+    monkeypatch.undo()
+    assert len(cache.entries()) == 1
+    racing_scandir(monkeypatch)
+    cache.clear()
+    assert cache.entries() == []
+
+def test_fetch_after_eviction(tmp_path):
+    cache = make_cache(tmp_path, 10 ** 6, 1)
+    out = tmp_path / "out.pdf"
+    assert cache.fetch("0", str(out)) and out.exists()
+    os.remove(cache.path("0"))
+    assert not cache.fetch("0", str(out))
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PySide6.QtWidgets")
+from PySide6.QtCore import QThreadPool
+import main
+import utils
+import workers
+from instrumentation import QueryBudgetExceeded
+from models import session
+from queries import fetch_first_cars
+
+# Бюджеты запросов экранов: главное окно и диалог ТО и расходов в Qt без дисплея
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+# Ошибки фоновых задач собираются в список вместо модального окна; фото не подгружаются
+# заранее и не берутся из кэша прошлых тестов - у каждой карточки худший случай
+@pytest.fixture
+def errors(app, monkeypatch):
+    errors = []
+    monkeypatch.setattr(workers, "show_message", lambda title, text, *args: errors.append(text))
+    monkeypatch.setattr(utils, "pixmap_cache", utils.PixmapCache())
+    monkeypatch.setattr(main.MainWindow, "prefetch_neighbours", lambda self: None)
+    return errors
+
+# Фоновые задачи завершаются, их результаты доставляются в GUI-поток
+def settle(app):
+    for _ in range(5):
+        QThreadPool.globalInstance().waitForDone(5000)
+        app.processEvents()
+
+def walk(app, window):
+    first = window.cursor.current().car_id
+    seen = [first]
+    while True:
+        window.next_car()
+        settle(app)
+        car_id = window.cursor.current().car_id
+        if car_id == first:
+            break
+        seen.append(car_id)
+    for _ in range(3):
+        window.prev_car()
+        settle(app)
+    return seen
+
+def test_navigate_main_window(app, errors):
+    window = main.MainWindow()
+    settle(app)
+    seen = walk(app, window)
+    assert errors == []
+    assert seen == sorted(seen) and len(seen) > window.cursor.window
+    assert window.cursor.current().car_id == seen[-3]
+    assert window.card.info.text().startswith(f"Номер: {window.cursor.current().number}")
+
+def test_navigate_main_window_lazy_relations(app, errors, lazy_card):
+    window = main.MainWindow()
+    settle(app)
+    with pytest.raises(QueryBudgetExceeded):
+        walk(app, window)
+
+def test_open_service_dialog(app, errors):
+    car = session.merge(fetch_first_cars(1)[0], load=False)
+    dialog = main.CarServiceExpensesDialog(car)
+    settle(app)
+    assert errors == []
+    assert dialog.service_model.rowCount() > 0
+
+# Диалог открывается по объекту из сессии GUI: устаревший автомобиль перечитывался бы при открытии
+def test_open_service_dialog_expired_car(app, errors):
+    car = session.merge(fetch_first_cars(1)[0], load=False)
+    session.expire(car)
+    with pytest.raises(QueryBudgetExceeded):
+        main.CarServiceExpensesDialog(car)
\ No newline at end of file
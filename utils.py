@@ -1,22 +1,81 @@
+from collections import OrderedDict
 from PySide6.QtWidgets import QFileDialog, QMessageBox
 from PySide6.QtGui import QPixmap
 from PySide6.QtCore import Qt
+from sqlalchemy import inspect
 from styles import StyleHelper
+from lookups import lookup_cache
+from photos import THUMB_SIZE
 
-def load_photo(photo_data, photo_label, size=(300, 300)):
+# Ограниченный LRU-кэш уже декодированных и масштабированных фото
+class PixmapCache:
+    def __init__(self, max_items=64):
+        self.max_items = max_items
+        self.items = OrderedDict()
+
+    def get(self, key, default=None):
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def put(self, key, pixmap):
+        self.items[key] = pixmap
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+pixmap_cache = PixmapCache()
+_MISSING = object()
+
+def show_pixmap(pixmap, photo_label, error_text="Нет фото"):
+    if pixmap is not None:
+        photo_label.setPixmap(pixmap)
+    else:
+        photo_label.setText(error_text)
+        StyleHelper.apply_widget_style(photo_label, "font-size: 16px;")
+    photo_label.setAlignment(Qt.AlignCenter)
+
+def load_photo(photo_data, photo_label, size=THUMB_SIZE):
     if photo_data and isinstance(photo_data, bytes):
         pixmap = QPixmap()
         if pixmap.loadFromData(photo_data):
-            photo_label.setPixmap(pixmap.scaled(*size, Qt.KeepAspectRatio))
+            show_pixmap(pixmap.scaled(*size, Qt.KeepAspectRatio), photo_label)
         else:
-            photo_label.setText("Ошибка загрузки фото")
-            StyleHelper.apply_widget_style(photo_label, "font-size: 16px;")
+            show_pixmap(None, photo_label, "Ошибка загрузки фото")
     else:
-        photo_label.setText("Нет фото")
-        StyleHelper.apply_widget_style(photo_label, "font-size: 16px;")
-    photo_label.setAlignment(Qt.AlignCenter)
+        show_pixmap(None, photo_label)
+
+# Фото автомобиля или водителя через кэш: ключ - сущность, её id и хэш содержимого
+def entity_pixmap(entity, size=THUMB_SIZE):
+    identity = inspect(entity).identity
+    key = (entity.__tablename__, identity, entity.photo_hash, size)
+    pixmap = pixmap_cache.get(key, _MISSING) if identity else _MISSING
+    if pixmap is _MISSING:
+        photo_data = entity.photo_thumb or entity.photo
+        pixmap = None
+        if photo_data:
+            decoded = QPixmap()
+            if not decoded.loadFromData(photo_data):
+                return None, "Ошибка загрузки фото"
+            pixmap = decoded.scaled(*size, Qt.KeepAspectRatio)
+        if identity:
+            pixmap_cache.put(key, pixmap)
+    return pixmap, "Нет фото"
+
+def load_entity_photo(entity, photo_label, size=THUMB_SIZE):
+    pixmap, error_text = entity_pixmap(entity, size)
+    show_pixmap(pixmap, photo_label, error_text)
+
+def prefetch_entity_photo(entity, size=THUMB_SIZE):
+    entity_pixmap(entity, size)
+
+# Заполнение выпадающего списка из кэша справочников
+def fill_combo(combo, name):
+    for item_id, label in lookup_cache.get(name):
+        combo.addItem(label, item_id)
 
-def select_photo(parent, photo_label, size=(300, 300)):
+def select_photo(parent, photo_label, size=THUMB_SIZE):
     file_name, _ = QFileDialog.getOpenFileName(parent, "Выбрать фото", "", "Images (*.png *.jpg *.jpeg)")
     if file_name:
         with open(file_name, 'rb') as f:
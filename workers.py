@@ -0,0 +1,48 @@
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from models import Session
+from utils import show_message
+
+class WorkerSignals(QObject):
+    finished = Signal(object)
+    failed = Signal(str)
+    progress = Signal(int)
+
+# Фоновая задача пула потоков: результат возвращается в GUI-поток через сигналы
+class Worker(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            Session.remove()
+
+# Задачи держатся здесь, пока их сигналы не доставлены
+_active = set()
+
+def show_error(text):
+    show_message("Ошибка", f"Ошибка при обращении к базе данных: {text}", "warning")
+
+# on_progress: задача получает аргумент progress и может сообщать о ходе работы в GUI-поток
+def run_in_background(fn, *args, on_done=None, on_error=None, on_progress=None, pool=None, **kwargs):
+    worker = Worker(fn, *args, **kwargs)
+    if on_progress:
+        worker.kwargs["progress"] = worker.signals.progress.emit
+        worker.signals.progress.connect(on_progress)
+    _active.add(worker)
+    if on_done:
+        worker.signals.finished.connect(on_done)
+    worker.signals.failed.connect(on_error or show_error)
+    worker.signals.finished.connect(lambda _: _active.discard(worker))
+    worker.signals.failed.connect(lambda _: _active.discard(worker))
+    (pool or QThreadPool.globalInstance()).start(worker)
+    return worker
\ No newline at end of file
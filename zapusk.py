@@ -1,14 +1,37 @@
-from PySide6.QtWidgets import QApplication
-from main import MainWindow
+import sys
 
-app = QApplication([])
-app.setStyleSheet("""
+STYLESHEET = """
     QMainWindow, QDialog { background-color: #fff9e6; }
     QPushButton { background-color: #ffeb3b; color: #333; padding: 8px; border-radius: 5px; border: none; font-family: Roboto; font-size: 14px; }
     QPushButton:hover { background-color: #ffd700; }
     QLineEdit, QComboBox { padding: 5px; border: 1px solid #ffd700; border-radius: 5px; background-color: #fffde7; font-family: Roboto; font-size: 14px; }
     QLabel, QListWidget { font-family: Roboto; font-size: 14px; }
-""")
-window = MainWindow()
-window.show()
-app.exec()
\ No newline at end of file
+"""
+
+# Запуск приложения до показа главного окна; тем же путем запуск измеряет bench.py launch.
+# Схема обновляется до создания окна: его первые фоновые запросы идут к уже обновленным
+# таблицам и столбцам. В актуальной базе это одна проверка версии; в фоне выполняются только
+# отложенные миграции (индексы поиска)
+def start(app):
+    from main import MainWindow
+    from migrations import upgrade
+    from utils import show_message
+    from workers import run_in_background
+    app.setStyleSheet(STYLESHEET)
+    try:
+        upgrade(deferred=False)
+    except Exception as e:
+        show_message("Ошибка", f"Не удалось обновить схему базы данных: {e}", "warning")
+        sys.exit(1)
+    run_in_background(upgrade, deferred=True)
+    window = MainWindow()
+    window.show()
+    return window
+
+# Точка входа защищена: процессы пакетной генерации отчетов (spawn) импортируют этот модуль заново
+# как __mp_main__, поэтому Qt и модули окна импортируются только при запуске приложения
+if __name__ == "__main__":
+    from PySide6.QtWidgets import QApplication
+    app = QApplication([])
+    window = start(app)
+    app.exec()
\ No newline at end of file